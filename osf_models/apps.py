@@ -32,3 +32,14 @@ class AppConfig(BaseAppConfig):
         api_base = '/v2/'
     else:
         api_base = api_settings.API_BASE
+
+    def ready(self):
+        from django.conf import settings
+        from osf_models.modm_compat import field_registry
+        from osf_models.utils.instrumentation import instrumentation
+        from osf_models.utils.log_writer import log_writer
+        from osf_models.utils.search_updater import search_updater
+        field_registry.populate(self.get_models())
+        instrumentation.configure(**getattr(settings, 'OSF_MODELS_INSTRUMENTATION', {}))
+        log_writer.configure(**getattr(settings, 'OSF_MODELS_LOG_WRITER', {}))
+        search_updater.configure(**getattr(settings, 'OSF_MODELS_SEARCH_UPDATER', {}))
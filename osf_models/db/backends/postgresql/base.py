@@ -1,11 +1,15 @@
+import time
 import uuid
 
 import psycopg2
+import psycopg2.extras
 from django.conf import settings
 from django.db.backends.postgresql.base import (
     DatabaseWrapper as PostgresqlDatabaseWrapper
 )
 from django.db.backends.postgresql.base import utc_tzinfo_factory
+from django.db.backends.utils import CursorDebugWrapper, CursorWrapper
+from osf_models.utils.instrumentation import instrumentation
 
 
 class server_side_cursors(object):
@@ -26,12 +30,44 @@ class server_side_cursors(object):
             self.connection = qs_or_using_or_connection
 
     def __enter__(self):
+        self.previous = (self.connection.server_side_cursors, self.connection.server_side_cursor_itersize)
         self.connection.server_side_cursors = True
         self.connection.server_side_cursor_itersize = self.itersize
 
     def __exit__(self, type, value, traceback):
-        self.connection.server_side_cursors = False
-        self.connection.server_side_cursor_itersize = None
+        self.connection.server_side_cursors, self.connection.server_side_cursor_itersize = self.previous
+
+
+class ServerSideCursor(psycopg2.extras.DictCursor):
+    """
+    Named cursor that fetches at least ``itersize`` rows per round trip. Django
+    always asks for GET_ITERATOR_CHUNK_SIZE (100) rows at a time.
+    """
+
+    def fetchmany(self, size=None):
+        return super(ServerSideCursor, self).fetchmany(max(size or 0, self.itersize))
+
+
+class InstrumentedCursorWrapper(CursorWrapper):
+    """
+    Cursor that reports its queries to ``osf_models.utils.instrumentation``.
+    """
+
+    def execute(self, sql, params=None):
+        start = time.time()
+        result = super(InstrumentedCursorWrapper, self).execute(sql, params)
+        instrumentation.record_query(self.db, sql, params, time.time() - start, self.cursor.rowcount)
+        return result
+
+    def executemany(self, sql, param_list):
+        start = time.time()
+        result = super(InstrumentedCursorWrapper, self).executemany(sql, param_list)
+        instrumentation.record_query(self.db, sql, None, time.time() - start, self.cursor.rowcount)
+        return result
+
+
+class InstrumentedCursorDebugWrapper(InstrumentedCursorWrapper, CursorDebugWrapper):
+    pass
 
 
 class DatabaseWrapper(PostgresqlDatabaseWrapper):
@@ -56,11 +92,29 @@ class DatabaseWrapper(PostgresqlDatabaseWrapper):
         if not self.server_side_cursors:
             return super(DatabaseWrapper, self).create_cursor()
 
+        # Outside of a transaction the cursor has to outlive the implicit commit
         cursor = self.connection.cursor(
             name='osf_models.db.backends.postgresql_cursors:{}'.format(
                 uuid.uuid4().hex),
-            cursor_factory=psycopg2.extras.DictCursor, )
+            cursor_factory=ServerSideCursor,
+            withhold=self.get_autocommit(), )
         cursor.tzinfo_factory = utc_tzinfo_factory if settings.USE_TZ else None
         cursor.itersize = self.server_side_cursor_itersize
 
         return cursor
+
+    def make_cursor(self, cursor):
+        if instrumentation.is_recording():
+            return InstrumentedCursorWrapper(cursor, self)
+        return super(DatabaseWrapper, self).make_cursor(cursor)
+
+    def make_debug_cursor(self, cursor):
+        if instrumentation.is_recording():
+            return InstrumentedCursorDebugWrapper(cursor, self)
+        return super(DatabaseWrapper, self).make_debug_cursor(cursor)
+
+    def savepoint_rollback(self, sid):
+        super(DatabaseWrapper, self).savepoint_rollback(sid)
+        # Imported here so that the backend doesn't depend on the models' modules
+        from osf_models.utils.log_writer import log_writer
+        log_writer.savepoint_rolled_back(sid)
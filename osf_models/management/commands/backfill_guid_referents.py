@@ -0,0 +1,31 @@
+import sys
+
+from django.apps import apps
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from osf_models.models import Guid
+from osf_models.models.base import BaseIDMixin
+
+
+class Command(BaseCommand):
+    help = 'Sets the typed referent pointer (content_type, referent_pk) on Guids that predate it'
+
+    def handle(self, *args, **options):
+        print('Starting {}...'.format(sys._getframe().f_code.co_name))
+        start = timezone.now()
+        models = [
+            model for model in apps.get_app_config('osf_models').get_models()
+            if issubclass(model, BaseIDMixin) and not model._meta.proxy
+        ]
+        for model in models:
+            with transaction.atomic():
+                registry = getattr(model, '_typedmodels_registry', None)
+                if registry:
+                    count = sum(Guid.update_referent_pointers(typed_model) for typed_model in registry.values())
+                else:
+                    count = Guid.update_referent_pointers(model)
+            print('Set {} referent pointers for {}'.format(count, model._meta.model.__name__))
+        print('Done with {} in {} seconds...'.format(
+            sys._getframe().f_code.co_name,
+            (timezone.now() - start).total_seconds()))
@@ -0,0 +1,69 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from osf_models.models import Contributor, NodeLog, OSFUser
+from osf_models.models.node import AbstractNode
+from osf_models.utils.auth import Auth
+
+
+class Rollback(Exception):
+    pass
+
+
+def summarize(fork):
+    """Count what a fork produced, to check that both paths give the same result."""
+    node_ids = [fork.pk] + [node.pk for node in fork.get_descendants_recursive()]
+    return {
+        'nodes': len(node_ids),
+        'contributors': Contributor.objects.filter(node_id__in=node_ids).count(),
+        'tags': AbstractNode.tags.through.objects.filter(abstractnode_id__in=node_ids).count(),
+        'citations': AbstractNode.alternative_citations.through.objects.filter(abstractnode_id__in=node_ids).count(),
+        'logs': NodeLog.objects.filter(node_id__in=node_ids).count(),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compares forking a node with the set-based fork engine and with the recursive path. Forks are rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('node', help='Guid of the node to fork')
+        parser.add_argument('user', help='Guid of the user that forks the node')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of forks per path')
+
+    def run(self, fork):
+        """Fork with ``fork`` inside a transaction that is rolled back. Return the
+        fastest time, the number of queries and a summary of the fork.
+        """
+        seconds = []
+        for _ in range(self.repeat):
+            try:
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as queries:
+                        start = time.time()
+                        forked = fork()
+                        seconds.append(time.time() - start)
+                    summary = summarize(forked)
+                    raise Rollback
+            except Rollback:
+                pass
+        return min(seconds), len(queries), summary
+
+    def handle(self, *args, **options):
+        node = AbstractNode.load(options['node'])
+        user = OSFUser.load(options['user'])
+        if node is None or user is None:
+            raise CommandError('No such node or user')
+        self.repeat = options['repeat']
+        auth = Auth(user)
+
+        results = [
+            ('Recursive', self.run(lambda: node._fork_node_recursive(auth))),
+            ('Set-based', self.run(lambda: node.fork_node(auth))),
+        ]
+        for name, (seconds, queries, summary) in results:
+            print('{}: {:.3f}s, {} queries, {}'.format(name, seconds, queries, summary))
+        if results[0][1][2] != results[1][1][2]:
+            print('Warning: the forks differ')
+        print('Speedup: {:.2f}x'.format(results[0][1][0] / results[1][1][0]))
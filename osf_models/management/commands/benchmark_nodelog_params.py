@@ -0,0 +1,70 @@
+import json
+import timeit
+
+from django.core.management import BaseCommand
+from django.db import connection
+from osf_models.models import NodeLog
+from osf_models.models.nodelog import PROMOTED_PARAMS, merge_params
+
+# The params as they were stored before they were split into columns
+LEGACY_PARAMS = """
+params || jsonb_strip_nulls(jsonb_build_object(
+    'node', params_node,
+    'project', params_project,
+    'parent_node', params_parent_node,
+    'contributors', to_jsonb(params_contributors)
+))
+"""
+
+SIZES_SQL = """
+SELECT
+    avg(pg_column_size({legacy})),
+    avg(pg_column_size(params) + {columns})
+FROM (SELECT * FROM {table} ORDER BY id DESC LIMIT %s) AS log
+"""
+
+ROWS_SQL = """
+SELECT ({legacy})::text, params::text, {promoted}
+FROM {table} ORDER BY id DESC LIMIT %s
+"""
+
+
+class Command(BaseCommand):
+    help = 'Compares the size and decode time of NodeLog params stored as one JSON document and split into columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=10000, help='Number of the newest logs to measure')
+
+    def handle(self, *args, **options):
+        sample = options['sample']
+        table = connection.ops.quote_name(NodeLog._meta.db_table)
+        promoted = ['params_{}'.format(key) for key in PROMOTED_PARAMS]
+        with connection.cursor() as cursor:
+            cursor.execute(SIZES_SQL.format(
+                legacy=LEGACY_PARAMS,
+                columns=' + '.join('coalesce(pg_column_size({}), 0)'.format(column) for column in promoted),
+                table=table,
+            ), [sample])
+            legacy_bytes, split_bytes = cursor.fetchone()
+            cursor.execute(ROWS_SQL.format(legacy=LEGACY_PARAMS, promoted=', '.join(promoted), table=table), [sample])
+            rows = cursor.fetchall()
+        if not rows:
+            print('No logs to measure')
+            return
+
+        def decode_legacy():
+            for row in rows:
+                json.loads(row[0])
+
+        def decode_split():
+            for row in rows:
+                merge_params(dict(zip(PROMOTED_PARAMS, row[2:])), json.loads(row[1]))
+
+        legacy_seconds = min(timeit.repeat(decode_legacy, number=1, repeat=3))
+        split_seconds = min(timeit.repeat(decode_split, number=1, repeat=3))
+        print('Logs: {}'.format(len(rows)))
+        print('One document: {:.1f} bytes/row, {:.2f}us/row to decode'.format(
+            legacy_bytes, legacy_seconds / len(rows) * 1e6))
+        print('Split: {:.1f} bytes/row, {:.2f}us/row to decode'.format(
+            split_bytes, split_seconds / len(rows) * 1e6))
+        print('Size: {:.2f}x smaller'.format(legacy_bytes / split_bytes))
@@ -0,0 +1,45 @@
+import timeit
+
+from django.core.management import BaseCommand
+from modularodm import Q as MQ
+from osf_models.models import Node, NodeLog, OSFUser
+from osf_models.modm_compat import Q, query_cache
+
+
+def make_queries(i):
+    return [
+        (Node, MQ('is_public', 'eq', True) & MQ('is_deleted', 'eq', False) & MQ('title', 'icontains', 'x{}'.format(i))),
+        (Node, (MQ('contributors', 'eq', i) | MQ('is_public', 'eq', True)) & MQ('parent_node', 'eq', None)),
+        (NodeLog, Q('node', 'in', [i, i + 1]) & Q('should_hide', 'ne', True)),
+        (OSFUser, MQ('emails', 'eq', 'user{}@example.com'.format(i)) | MQ('username', 'eq', 'user{}'.format(i))),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Compares translating compound modm queries with and without the compiled query cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--number', type=int, default=10000, help='Number of rounds per run')
+
+    def handle(self, *args, **options):
+        number = options['number']
+        queries = [make_queries(i) for i in range(number)]
+
+        def uncached():
+            for round_of_queries in queries:
+                for model_cls, query in round_of_queries:
+                    Q.from_modm_query(query, model_cls=model_cls).to_django_query()
+
+        def cached():
+            for round_of_queries in queries:
+                for model_cls, query in round_of_queries:
+                    query_cache.to_django_query(query, model_cls=model_cls)
+
+        query_cache.clear()
+        uncached_seconds = min(timeit.repeat(uncached, number=1, repeat=3))
+        cached_seconds = min(timeit.repeat(cached, number=1, repeat=3))
+        translations = number * len(queries[0])
+        print('Uncached: {:.0f} translations/second'.format(translations / uncached_seconds))
+        print('Cached: {:.0f} translations/second'.format(translations / cached_seconds))
+        print('Speedup: {:.2f}x'.format(uncached_seconds / cached_seconds))
+        print('Cache: {}'.format(query_cache.stats()))
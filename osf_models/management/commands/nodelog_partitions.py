@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from osf_models.utils import nodelog_partitions
+
+
+class Command(BaseCommand):
+    help = (
+        'Manages the monthly partitions of the NodeLog table. "list" shows the partitions, '
+        '"roll" moves logs older than {} months into partitions (creating them as needed) and '
+        '"archive" moves old partitions into the archive table.'
+    ).format(nodelog_partitions.HOT_MONTHS)
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['list', 'roll', 'archive'])
+        parser.add_argument('--archive-after', type=int, default=24,
+                            help='Archive the partitions of months that ended at least this many months ago')
+
+    def handle(self, *args, **options):
+        print('Starting {}...'.format(sys._getframe().f_code.co_name))
+        start = timezone.now()
+        action = options['action']
+        if action == 'list':
+            for name, month in nodelog_partitions.list_partitions():
+                print('{} ({:%Y-%m})'.format(name, month))
+        elif action == 'roll':
+            with transaction.atomic():
+                for name, count in nodelog_partitions.roll(start):
+                    print('Moved {} logs into {}'.format(count, name))
+        elif action == 'archive':
+            before = nodelog_partitions.month_start(start, months_ago=options['archive_after'])
+            with transaction.atomic():
+                for name, count in nodelog_partitions.archive(before):
+                    print('Archived {} logs from {}'.format(count, name))
+        print('Done with {} in {} seconds...'.format(
+            sys._getframe().f_code.co_name,
+            (timezone.now() - start).total_seconds()))
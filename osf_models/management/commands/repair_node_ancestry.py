@@ -0,0 +1,20 @@
+import sys
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from osf_models.models.node import AbstractNode
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the materialized ancestry (ancestor_ids and root) of every node from parent_node'
+
+    def handle(self, *args, **options):
+        print('Starting {}...'.format(sys._getframe().f_code.co_name))
+        start = timezone.now()
+        with transaction.atomic():
+            count = AbstractNode.repair_ancestry()
+        print('Repaired the ancestry of {} nodes'.format(count))
+        print('Done with {} in {} seconds...'.format(
+            sys._getframe().f_code.co_name,
+            (timezone.now() - start).total_seconds()))
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf_models', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                'CREATE SEQUENCE osf_models_guid_block_seq_5;',
+                'CREATE SEQUENCE osf_models_guid_block_seq_12;',
+            ],
+            [
+                'DROP SEQUENCE osf_models_guid_block_seq_5;',
+                'DROP SEQUENCE osf_models_guid_block_seq_12;',
+            ]
+        ),
+    ]
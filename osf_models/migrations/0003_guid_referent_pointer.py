@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('osf_models', '0002_guid_block_sequences'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='guid',
+            name='content_type',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType'),
+        ),
+        migrations.AddField(
+            model_name='guid',
+            name='referent_pk',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='guid',
+            index_together=set([('content_type', 'referent_pk')]),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+# Same as osf_models.models.node.REPAIR_ANCESTRY_SQL
+BACKFILL_ANCESTRY_SQL = """
+WITH RECURSIVE ancestry(id, ancestor_ids) AS (
+    SELECT id, ARRAY[]::integer[] FROM osf_models_abstractnode WHERE parent_node_id IS NULL
+    UNION ALL
+    SELECT child.id, ancestry.ancestor_ids || ancestry.id FROM osf_models_abstractnode AS child
+    JOIN ancestry ON child.parent_node_id = ancestry.id
+)
+UPDATE osf_models_abstractnode AS node SET
+    ancestor_ids = ancestry.ancestor_ids,
+    root_id = COALESCE(ancestry.ancestor_ids[1], ancestry.id)
+FROM ancestry
+WHERE node.id = ancestry.id AND (
+    node.ancestor_ids IS DISTINCT FROM ancestry.ancestor_ids OR
+    node.root_id IS DISTINCT FROM COALESCE(ancestry.ancestor_ids[1], ancestry.id)
+)
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf_models', '0003_guid_referent_pointer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='abstractnode',
+            name='ancestor_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX osf_models_abstractnode_ancestor_ids_gin ON osf_models_abstractnode USING gin (ancestor_ids);',
+            'DROP INDEX osf_models_abstractnode_ancestor_ids_gin;'
+        ),
+        migrations.RunSQL(BACKFILL_ANCESTRY_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf_models', '0004_node_ancestor_ids'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='nodelog',
+            index_together=set([('node', 'date')]),
+        ),
+    ]
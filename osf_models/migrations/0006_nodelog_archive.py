@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Archive for cold NodeLog partitions (see osf_models.utils.nodelog_partitions). Rows are
+# written once and read rarely, so pages are packed full and only (node_id, date) is indexed.
+CREATE_ARCHIVE_SQL = """
+CREATE TABLE osf_models_nodelog_archive (LIKE osf_models_nodelog INCLUDING DEFAULTS) WITH (fillfactor = 100);
+CREATE INDEX osf_models_nodelog_archive_node_id_date ON osf_models_nodelog_archive (node_id, date);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf_models', '0005_nodelog_node_date_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_ARCHIVE_SQL, 'DROP TABLE osf_models_nodelog_archive;'),
+    ]
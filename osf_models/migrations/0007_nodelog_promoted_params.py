@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+import osf_models.utils.datetime_aware_jsonfield
+
+# Moves the params that osf_models.models.nodelog.split_params promotes into their own columns
+PROMOTE_PARAMS_SQL = """
+UPDATE {table} SET
+    params_node = CASE WHEN jsonb_typeof(params->'node') = 'string' THEN params->>'node' END,
+    params_project = CASE WHEN jsonb_typeof(params->'project') = 'string' THEN params->>'project' END,
+    params_parent_node = CASE WHEN jsonb_typeof(params->'parent_node') = 'string' THEN params->>'parent_node' END,
+    params_contributors = CASE WHEN jsonb_typeof(params->'contributors') = 'array' AND NOT EXISTS (
+        SELECT 1 FROM jsonb_array_elements(params->'contributors') AS contributor
+        WHERE jsonb_typeof(contributor) <> 'string'
+    ) THEN ARRAY(SELECT jsonb_array_elements_text(params->'contributors')) END
+WHERE params ?| ARRAY['node', 'project', 'parent_node', 'contributors'];
+
+UPDATE {table} SET params = params
+    - CASE WHEN params_node IS NULL THEN '' ELSE 'node' END
+    - CASE WHEN params_project IS NULL THEN '' ELSE 'project' END
+    - CASE WHEN params_parent_node IS NULL THEN '' ELSE 'parent_node' END
+    - CASE WHEN params_contributors IS NULL THEN '' ELSE 'contributors' END
+WHERE params_node IS NOT NULL OR params_project IS NOT NULL
+    OR params_parent_node IS NOT NULL OR params_contributors IS NOT NULL;
+"""
+
+DEMOTE_PARAMS_SQL = """
+UPDATE {table} SET params = params || jsonb_strip_nulls(jsonb_build_object(
+    'node', params_node,
+    'project', params_project,
+    'parent_node', params_parent_node,
+    'contributors', to_jsonb(params_contributors)
+));
+"""
+
+# The archive table (see 0006) isn't managed by Django, so it gets the columns here
+ADD_ARCHIVE_COLUMNS_SQL = """
+ALTER TABLE osf_models_nodelog_archive
+    ADD COLUMN params_node varchar(255) NULL,
+    ADD COLUMN params_project varchar(255) NULL,
+    ADD COLUMN params_parent_node varchar(255) NULL,
+    ADD COLUMN params_contributors varchar(255)[] NULL;
+"""
+
+DROP_ARCHIVE_COLUMNS_SQL = """
+ALTER TABLE osf_models_nodelog_archive
+    DROP COLUMN params_node,
+    DROP COLUMN params_project,
+    DROP COLUMN params_parent_node,
+    DROP COLUMN params_contributors;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf_models', '0006_nodelog_archive'),
+    ]
+
+    operations = [
+        # The remainder keeps the params column
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.RenameField(
+                model_name='nodelog',
+                old_name='params',
+                new_name='_params',
+            ),
+            migrations.AlterField(
+                model_name='nodelog',
+                name='_params',
+                field=osf_models.utils.datetime_aware_jsonfield.DateTimeAwareJSONField(blank=True, db_column='params', default=dict),
+            ),
+        ]),
+        migrations.AddField(
+            model_name='nodelog',
+            name='params_contributors',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=255), blank=True, null=True, size=None),
+        ),
+        migrations.AddField(
+            model_name='nodelog',
+            name='params_node',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='nodelog',
+            name='params_parent_node',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='nodelog',
+            name='params_project',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.RunSQL(ADD_ARCHIVE_COLUMNS_SQL, DROP_ARCHIVE_COLUMNS_SQL),
+        migrations.RunSQL(
+            PROMOTE_PARAMS_SQL.format(table='osf_models_nodelog'),
+            DEMOTE_PARAMS_SQL.format(table='osf_models_nodelog'),
+        ),
+        migrations.RunSQL(
+            PROMOTE_PARAMS_SQL.format(table='osf_models_nodelog_archive'),
+            DEMOTE_PARAMS_SQL.format(table='osf_models_nodelog_archive'),
+        ),
+    ]
@@ -1,20 +1,46 @@
 import logging
 import random
+from collections import OrderedDict
 from datetime import datetime
 
 import modularodm.exceptions
 import pytz
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError as DjangoValidationError
-from django.db import models
+from django.db import connection, connections, models
+from osf_models.db.backends.postgresql.base import server_side_cursors
 from osf_models.exceptions import ValidationError
-from osf_models.modm_compat import to_django_query, Q
+from osf_models.modm_compat import to_django_query, field_registry, Q
 from osf_models.utils.base import generate_object_id
+from osf_models.utils.guid_pool import GuidPool, GuidPoolExhausted
+from osf_models.utils.identity_map import get_identity_map, identity_mapped
+from osf_models.utils.instrumentation import instrumented, instrumented_queryset, record_evaluation
+from osf_models.utils.keyset import decode_cursor, encode_cursor, keyset_filter, keyset_keys, keyset_values
 
 ALPHABET = '23456789abcdefghjkmnpqrstuvwxyz'
 
+# Guid lengths that have a block sequence (see migration 0002_guid_block_sequences)
+GUID_POOLS = {length: GuidPool(length, ALPHABET) for length in (5, 12)}
+
+UPDATE_REFERENT_POINTERS_SQL = """
+UPDATE {guid_table} SET content_type_id = %s, referent_pk = referent.id
+FROM {referent_table} AS referent
+WHERE referent.guid_id = {guid_table}.id
+"""
+
 logger = logging.getLogger(__name__)
 
 def generate_guid(length=5):
+    pool = GUID_POOLS.get(length)
+    if pool is not None:
+        try:
+            return pool.take()
+        except GuidPoolExhausted as e:
+            logger.warning('{}; generating a random guid'.format(e))
+    return generate_random_guid(length)
+
+
+def generate_random_guid(length=5):
     while True:
         guid_id = ''.join(random.sample(ALPHABET, length))
 
@@ -31,6 +57,27 @@ def generate_guid(length=5):
 
 
 class MODMCompatibilityQuerySet(models.QuerySet):
+    # Set by the instrumented compat entry points (see osf_models.utils.instrumentation)
+    _instrumented = None
+
+    def _clone(self, **kwargs):
+        clone = super(MODMCompatibilityQuerySet, self)._clone(**kwargs)
+        clone._instrumented = self._instrumented
+        return clone
+
+    @record_evaluation
+    def _fetch_all(self):
+        return super(MODMCompatibilityQuerySet, self)._fetch_all()
+
+    @record_evaluation
+    def count(self):
+        return super(MODMCompatibilityQuerySet, self).count()
+
+    @record_evaluation
+    def exists(self):
+        return super(MODMCompatibilityQuerySet, self).exists()
+
+    @instrumented_queryset('sort')
     def sort(self, *fields):
         # Fields are passed in as e.g. [('title', 1), ('date_created', -1)]
         if isinstance(fields[0], list):
@@ -46,9 +93,78 @@ class MODMCompatibilityQuerySet(models.QuerySet):
         sort_keys = [sort_key(each) for each in fields]
         return self.order_by(*sort_keys)
 
+    @instrumented_queryset('limit')
     def limit(self, n):
         return self[:n]
 
+    def without_guid(self):
+        """Don't select the guid along with each object (see ``BaseIDManager``).
+        Useful on hot paths that never touch ``_id``.
+        """
+        clone = self._clone()
+        if isinstance(clone.query.select_related, dict):
+            clone.query.select_related.pop('guid', None)
+            if not clone.query.select_related:
+                clone.query.select_related = False
+        return clone
+
+    def seek(self, cursor=None, limit=100):
+        """Keyset pagination over the queryset's sort order (e.g. from ``sort()``).
+        Unlike offset slicing, every page costs the same as the first. The pk is
+        used as a tie-breaker, and ascending and descending keys may be mixed.
+        Sort keys must not be null.
+
+            page, cursor = NodeLog.find(query).sort('-date').seek(limit=100)
+            next_page, cursor = NodeLog.find(query).sort('-date').seek(cursor, limit=100)
+
+        :param str cursor: Opaque cursor returned with the previous page, or None for the first page
+        :return: tuple of the page (a list) and the cursor for the next page, or None if
+            this is the last page
+        :raises ValueError: if ``cursor`` is invalid or was made for another sort order
+        """
+        query = self.query
+        ordering = query.order_by or (query.get_meta().ordering if query.default_ordering else [])
+        keys = keyset_keys(ordering, pk_name=self.model._meta.pk.name)
+        queryset = self.order_by(*keys)
+        if cursor is not None:
+            queryset = queryset.filter(keyset_filter(keys, decode_cursor(cursor, keys)))
+        # Fetch one extra row to find out whether there is a next page
+        page = queryset._first_rows(limit + 1)
+        if len(page) <= limit:
+            return page, None
+        page = page[:limit]
+        return page, encode_cursor(keys, keyset_values(page[-1], keys))
+
+    def _first_rows(self, count):
+        """The first ``count`` rows of the (ordered) queryset, as a list. Used by ``seek``."""
+        return list(self[:count])
+
+    def stream(self, chunk_size=2000):
+        """Iterate over the queryset with a named server side cursor, fetching
+        ``chunk_size`` rows at a time, so that memory stays bounded on large tables.
+
+        Only this queryset's cursor is server side: other queries may run on the
+        same connection while iterating. Like ``iterator()``, ``prefetch_related``
+        is ignored.
+        """
+        connection = connections[self.db]
+        iterator = self.iterator()
+        if not hasattr(connection, 'server_side_cursors'):
+            # Not the osf_models postgres backend; fall back to client side chunks
+            for obj in iterator:
+                yield obj
+            return
+        # The cursor is created when the iterator is first advanced, so server
+        # side cursors only need to be enabled for that first step
+        with server_side_cursors(connection, itersize=chunk_size):
+            try:
+                first = next(iterator)
+            except StopIteration:
+                return
+        yield first
+        for obj in iterator:
+            yield obj
+
 
 class BaseModel(models.Model):
     """Base model that acts makes subclasses mostly compatible with the
@@ -63,6 +179,8 @@ class BaseModel(models.Model):
         abstract = True
 
     @classmethod
+    @instrumented('load')
+    @identity_mapped
     def load(cls, data):
         try:
             if issubclass(cls, GuidMixin):
@@ -74,15 +192,32 @@ class BaseModel(models.Model):
             return None
 
     @classmethod
+    def load_many(cls, ids):
+        """Load the objects with the given primary keys in a single query.
+
+        :return: OrderedDict mapping each id in ``ids`` to its object, or None if it
+            does not exist (like ``load``)
+        """
+        ids = list(ids)
+        found = cls.objects.in_bulk(ids)
+        return OrderedDict((each, found.get(each)) for each in ids)
+
+    @classmethod
+    @instrumented('find_one')
     def find_one(cls, query):
         try:
-            return cls.objects.get(to_django_query(query, model_cls=cls))
+            obj = cls.objects.get(to_django_query(query, model_cls=cls))
         except cls.DoesNotExist:
             raise modularodm.exceptions.NoResultsFound()
         except cls.MultipleObjectsReturned as e:
             raise modularodm.exceptions.MultipleResultsFound(*e.args)
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            return identity_map.canonical(obj)
+        return obj
 
     @classmethod
+    @instrumented_queryset('find')
     def find(cls, query=None):
         if not query:
             return cls.objects.all()
@@ -90,7 +225,18 @@ class BaseModel(models.Model):
             return cls.objects.filter(to_django_query(query, model_cls=cls))
 
     @classmethod
+    def find_iter(cls, query=None, chunk_size=2000):
+        """Like ``find``, but streams the results with a server side cursor
+        instead of loading them all into memory. See ``MODMCompatibilityQuerySet.stream``.
+        """
+        return cls.find(query).stream(chunk_size=chunk_size)
+
+    @classmethod
+    @instrumented('remove')
     def remove(cls, query):
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            identity_map.discard_model(cls)
         return cls.find(query).delete()
 
     @classmethod
@@ -121,7 +267,17 @@ class BaseModel(models.Model):
                 self.full_clean()
             except DjangoValidationError as err:
                 raise ValidationError(*err.args)
-        return super(BaseModel, self).save(*args, **kwargs)
+        ret = super(BaseModel, self).save(*args, **kwargs)
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            identity_map.saved(self)
+        return ret
+
+    def delete(self, *args, **kwargs):
+        identity_map = get_identity_map()
+        if identity_map is not None:
+            identity_map.discard(self)
+        return super(BaseModel, self).delete(*args, **kwargs)
 
     @classmethod
     def migrate_from_modm(cls, modm_obj):
@@ -142,10 +298,9 @@ class BaseModel(models.Model):
         django_obj = cls()
         django_obj.guid = guid
 
-        local_django_fields = set([x.name for x in django_obj._meta.get_fields() if not x.is_relation])
+        local_django_fields = field_registry.local_field_names(cls)
 
-        intersecting_fields = set(modm_obj.to_storage().keys()).intersection(
-            set(local_django_fields))
+        intersecting_fields = local_django_fields.intersection(modm_obj.to_storage().keys())
 
         for field in intersecting_fields:
             modm_value = getattr(modm_obj, field)
@@ -184,6 +339,14 @@ class Guid(BaseModel):
                                  null=True,
                                  blank=True)
 
+    # Typed pointer to the referent, so it can be loaded without probing every
+    # referent_* relation. Set by BaseIDMixin.save; see the backfill_guid_referents command.
+    content_type = models.ForeignKey(ContentType, null=True, blank=True)
+    referent_pk = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        index_together = ('content_type', 'referent_pk')
+
     def initialize_guid(self, instance):
         self.guid = generate_guid(length=instance.__guid_min_length__)
 
@@ -196,32 +359,67 @@ class Guid(BaseModel):
 
     # Override load in order to load by GUID
     @classmethod
+    @instrumented('load')
+    @identity_mapped
     def load(cls, data):
         try:
             return cls.objects.get(guid=data)
         except cls.DoesNotExist:
             return None
 
+    @classmethod
+    def load_many(cls, ids):
+        ids = list(ids)
+        found = {each.guid: each for each in cls.objects.filter(guid__in=set(ids))}
+        return OrderedDict((each, found.get(each)) for each in ids)
+
     @classmethod
     def find(cls, query, *args, **kwargs):
-        # Make referent queryable
+        # Make referent queryable. Referents point at their Guid, so this is
+        # a lookup on the Guid's own primary key.
         # NOTE: This won't work with compound queries
         if hasattr(query, 'attribute') and query.attribute == 'referent':
-            # We rely on the fact that the related_name for BaseIDMixin.guid
-            # is 'referent_<lowercased class name>'
-            class_name = query.argument.__class__.__name__.lower()
-            return super(Guid, cls).find(Q('referent_{}'.format(class_name), query.op, query.argument))
+            # A None referent matches no Guid
+            if query.operator in ('in', 'nin'):
+                guid_ids = [each.guid_id for each in query.argument if each is not None]
+            else:
+                guid_ids = getattr(query.argument, 'guid_id', None)
+            return super(Guid, cls).find(Q('id', query.operator, guid_ids))
         else:
             return super(Guid, cls).find(query, *args, **kwargs)
 
     @property
     def referent(self):
         """The model instance that this Guid refers to. May return an instance of
-        any model that inherits from GuidMixin.
+        any model that inherits from BaseIDMixin.
         """
-        # Because the related_name for '_guid' is dynamic (e.g. 'referent_osfuser'),
-        # we need to check each one-to-one field
-        # until we find a match
+        if not hasattr(self, '_cached_referent'):
+            self._cached_referent = self._load_referent()
+        return self._cached_referent
+
+    @referent.setter
+    def referent(self, obj):
+        self._cached_referent = obj
+        if obj is None:
+            self.content_type = None
+            self.referent_pk = None
+            return
+        obj.guid = self
+        if obj.pk:
+            self.content_type = ContentType.objects.get_for_model(obj, for_concrete_model=False)
+            self.referent_pk = obj.pk
+
+    def _load_referent(self):
+        if self.content_type_id and self.referent_pk:
+            model_cls = ContentType.objects.get_for_id(self.content_type_id).model_class()
+            try:
+                referent = model_cls.objects.get(pk=self.referent_pk)
+            except model_cls.DoesNotExist:
+                return None
+            referent.guid = self
+            return referent
+        # Guids that predate the typed pointer: check each one-to-one field
+        # (the related_name is dynamic, e.g. 'referent_osfuser') until we find a match
         referent_fields = (each for each in self._meta.get_fields()
                            if each.one_to_one and each.name.startswith('referent'))
         for relationship in referent_fields:
@@ -231,9 +429,62 @@ class Guid(BaseModel):
                 continue
         return None
 
-    @referent.setter
-    def referent(self, obj):
-        obj.guid = self
+    @classmethod
+    def update_referent_pointers(cls, model_cls, guid_ids=None):
+        """Point Guids at their ``model_cls`` referents with a single UPDATE.
+
+        :param model_cls: A model that inherits from BaseIDMixin
+        :param guid_ids: Only update these Guids (by pk); by default, update every
+            Guid whose pointer is unset
+        :return: Number of updated Guids
+        """
+        content_type = ContentType.objects.get_for_model(model_cls, for_concrete_model=False)
+        sql = UPDATE_REFERENT_POINTERS_SQL.format(
+            guid_table=cls._meta.db_table,
+            referent_table=model_cls._meta.db_table,
+        )
+        params = [content_type.id]
+        if guid_ids is None:
+            sql += ' AND ({0}.referent_pk IS NULL OR {0}.content_type_id IS NULL)'.format(cls._meta.db_table)
+        else:
+            sql += ' AND {}.id = ANY(%s)'.format(cls._meta.db_table)
+            params.append(list(guid_ids))
+        if hasattr(model_cls, '_typedmodels_type'):
+            # TypedModel subclasses share a table and are told apart by their type column
+            sql += ' AND referent.type = %s'
+            params.append(model_cls._typedmodels_type)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+    @classmethod
+    def load_referents(cls, guids):
+        """Resolve the referents of many Guids with one query per referent model.
+
+        :param guids: Iterable of Guid instances, or None
+        :return: List of referents, in the same order as ``guids`` (None for missing referents
+            and None guids)
+        """
+        guids = list(guids)
+        loaded = [guid for guid in guids if guid is not None]
+        pks_by_content_type = {}
+        for guid in loaded:
+            if not hasattr(guid, '_cached_referent') and guid.content_type_id and guid.referent_pk:
+                pks_by_content_type.setdefault(guid.content_type_id, set()).add(guid.referent_pk)
+
+        referents = {}
+        for content_type_id, pks in pks_by_content_type.items():
+            model_cls = ContentType.objects.get_for_id(content_type_id).model_class()
+            for referent in model_cls.objects.filter(pk__in=pks):
+                referents[(content_type_id, referent.pk)] = referent
+
+        for guid in loaded:
+            if not hasattr(guid, '_cached_referent') and guid.content_type_id and guid.referent_pk:
+                referent = referents.get((guid.content_type_id, guid.referent_pk))
+                if referent is not None:
+                    referent.guid = guid
+                guid._cached_referent = referent
+        return [guid.referent if guid is not None else None for guid in guids]
 
     @classmethod
     def migrate_from_modm(cls, modm_obj):
@@ -293,6 +544,16 @@ class PKIDStr(str):
         return self.__pk
 
 
+class BaseIDManager(models.Manager.from_queryset(MODMCompatibilityQuerySet)):
+    """Default manager for models that inherit from BaseIDMixin. Selects the guid
+    along with each object so that accessing ``_id`` never issues its own query.
+    Opt out with ``without_guid()``.
+    """
+
+    def get_queryset(self):
+        return super(BaseIDManager, self).get_queryset().select_related('guid')
+
+
 class BaseIDMixin(models.Model):
     __guid_min_length__ = 5
 
@@ -301,6 +562,8 @@ class BaseIDMixin(models.Model):
                                  unique=True,
                                  related_name='referent_%(class)s')
 
+    objects = BaseIDManager()
+
     @property
     def _id(self):
         if self.guid:
@@ -312,6 +575,8 @@ class BaseIDMixin(models.Model):
     _primary_key = _id
 
     @classmethod
+    @instrumented('load')
+    @identity_mapped
     def load(cls, q):
         # modm doesn't throw exceptions when loading things that don't exist
         kwargs = {'guid__{}'.format(cls.primary_identifier_name): q}
@@ -320,19 +585,88 @@ class BaseIDMixin(models.Model):
         except cls.DoesNotExist:
             return None
 
+    @classmethod
+    def load_many(cls, ids):
+        """Load the objects with the given guids or object_ids in a single query.
+
+        :return: OrderedDict mapping each id in ``ids`` to its object, or None if it
+            does not exist (like ``load``)
+        """
+        ids = list(ids)
+        kwargs = {'guid__{}__in'.format(cls.primary_identifier_name): set(ids)}
+        queryset = cls.objects.filter(**kwargs).select_related('guid')
+        found = {getattr(each.guid, cls.primary_identifier_name): each for each in queryset}
+        return OrderedDict((each, found.get(each)) for each in ids)
+
     def clone(self):
         ret = super(BaseIDMixin, self).clone()
         ret.guid = None
         return ret
 
+    @classmethod
+    def bulk_create_with_guids(cls, objs, batch_size=1000):
+        """Insert many objects along with their Guids in a fixed number of queries per batch:
+        one insert and one select for the Guids, one insert and one select for the objects,
+        and one update that points the Guids at the objects.
+
+        Like ``bulk_create``, this bypasses ``save`` (so no validation or signals).
+
+        :param list objs: Unsaved instances of this model
+        :param int batch_size: Number of objects inserted per batch
+        :return: ``objs``, with ``guid`` and ``pk`` set
+        """
+        objs = list(objs)
+        content_type = ContentType.objects.get_for_model(cls, for_concrete_model=False)
+        identifier_name = cls.primary_identifier_name
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+
+            guids = []
+            for obj in batch:
+                if obj.guid_id is None:
+                    guid = Guid(content_type=content_type)
+                    getattr(guid, 'initialize_{}'.format(identifier_name))(obj)
+                    guids.append(guid)
+                    obj.guid = guid
+            if guids:
+                Guid.objects.bulk_create(guids)
+                identifiers = [getattr(each, identifier_name) for each in guids]
+                guid_pks = dict(Guid.objects.filter(
+                    **{'{}__in'.format(identifier_name): identifiers}
+                ).values_list(identifier_name, 'pk'))
+                for obj in batch:
+                    if obj.guid_id is None:
+                        obj.guid.pk = guid_pks[getattr(obj.guid, identifier_name)]
+                        # Re-assign so that the guid_id column picks up the new pk
+                        obj.guid = obj.guid
+
+            cls.objects.bulk_create(batch)
+            guid_ids = [obj.guid_id for obj in batch]
+            pks = dict(cls.objects.without_guid().filter(guid_id__in=guid_ids).values_list('guid_id', 'pk'))
+            for obj in batch:
+                obj.pk = pks[obj.guid_id]
+                obj.guid.content_type = content_type
+                obj.guid.referent_pk = obj.pk
+                obj.guid._cached_referent = obj
+            Guid.update_referent_pointers(cls, guid_ids=guid_ids)
+        return objs
+
     def save(self, *args, **kwargs):
+        content_type = ContentType.objects.get_for_model(self, for_concrete_model=False)
         if not self.guid:
-            self.guid = Guid.objects.create()
+            self.guid = Guid(content_type=content_type)
         if not getattr(self.guid, self.primary_identifier_name, None):
             initialization_method = getattr(self.guid, 'initialize_{}'.format(self.primary_identifier_name))
             initialization_method(self)
             self.guid.save()
-        return super(BaseIDMixin, self).save(*args, **kwargs)
+        ret = super(BaseIDMixin, self).save(*args, **kwargs)
+        if self.guid.content_type_id != content_type.id or self.guid.referent_pk != self.pk:
+            # Keep the Guid's typed pointer in sync (the pk is only known after the first save)
+            self.guid.content_type = content_type
+            self.guid.referent_pk = self.pk
+            Guid.objects.filter(pk=self.guid.pk).update(content_type=content_type, referent_pk=self.pk)
+        self.guid._cached_referent = self
+        return ret
 
     @classmethod
     def migrate_from_modm(cls, modm_obj):
@@ -350,10 +684,9 @@ class BaseIDMixin(models.Model):
         django_obj = cls()
         django_obj.guid = guid
 
-        local_django_fields = set([x.name for x in django_obj._meta.get_fields() if not x.is_relation])
+        local_django_fields = field_registry.local_field_names(cls)
 
-        intersecting_fields = set(modm_obj.to_storage().keys()).intersection(
-            set(local_django_fields))
+        intersecting_fields = local_django_fields.intersection(modm_obj.to_storage().keys())
 
         for field in intersecting_fields:
             modm_value = getattr(modm_obj, field)
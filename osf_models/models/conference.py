@@ -3,7 +3,7 @@ import json
 import re
 
 from django.db import models
-from osf_models.models.base import BaseModel, ObjectIDMixin
+from osf_models.models.base import BaseIDManager, BaseModel, ObjectIDMixin
 from osf_models.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 
 from website.conferences.exceptions import ConferenceError
@@ -26,7 +26,7 @@ def get_default_field_names():
     return DEFAULT_FIELD_NAMES
 
 
-class ConferenceManager(models.Manager):
+class ConferenceManager(BaseIDManager):
     def get_by_endpoint(self, endpoint, active=True):
         try:
             if active:
@@ -1,13 +1,15 @@
 import pytz
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Greatest
 from django.apps import apps
+from django.utils import timezone
 
 from osf_models.models.tag import Tag
 from osf_models.models.nodelog import NodeLog
+from osf_models.utils.log_writer import log_writer
 from website.exceptions import NodeStateError
 
-from framework.analytics import increment_user_activity_counters
-
 
 class Versioned(models.Model):
     """A Model mixin class that saves delta versions."""
@@ -53,6 +55,44 @@ class Loggable(models.Model):
     # TODO: This should be in the NodeLog model
 
     def add_log(self, action, params, auth, foreign_user=None, log_date=None, save=True, request=None):
+        """Add a log with one insert, and bump ``date_modified`` with one conditional update
+        (or with ``save``, if ``save`` is True). In buffered mode the log is inserted when
+        the transaction commits (see ``osf_models.utils.log_writer``).
+        """
+        log = self._build_log(
+            action, params, auth, foreign_user=foreign_user, log_date=log_date, request=request
+        )
+        log_writer.write([log])
+        self._touch(log.date, save=save)
+        return log
+
+    def add_logs(self, logs, auth, save=True, request=None):
+        """Add many logs at once, with one insert for all of them and one update of
+        ``date_modified``.
+
+        :param list logs: Dicts of the keyword arguments to ``add_log`` for each log
+            (``action``, ``params`` and optionally ``foreign_user`` and ``log_date``)
+        :return: The new logs
+        """
+        AbstractNode = apps.get_model('osf_models.AbstractNode')
+        node_ids = set()
+        for each in logs:
+            params = each['params']
+            params['node'] = params.get('node') or params.get('project') or self._id
+            if params['node'] != self._id:
+                node_ids.add(params['node'])
+        original_nodes = AbstractNode.load_many(node_ids) if node_ids else {}
+        built = [
+            self._build_log(auth=auth, request=request, original_nodes=original_nodes, **each)
+            for each in logs
+        ]
+        log_writer.write(built)
+        if built:
+            self._touch(max(log.date for log in built), save=save)
+        return built
+
+    def _build_log(self, action, params, auth, foreign_user=None, log_date=None, request=None,
+                   original_nodes=None):
         AbstractNode = apps.get_model('osf_models.AbstractNode')
         user = None
         if auth:
@@ -61,27 +101,33 @@ class Loggable(models.Model):
             user = request.user
 
         params['node'] = params.get('node') or params.get('project') or self._id
-        original_node = AbstractNode.load(params.get('node'))
+        if params['node'] == self._id:
+            original_node = self
+        elif original_nodes is not None:
+            original_node = original_nodes.get(params['node'])
+        else:
+            original_node = AbstractNode.load(params['node'])
         log = NodeLog(
             action=action, user=user, foreign_user=foreign_user,
             params=params, node=self, original_node=original_node
         )
-
         if log_date:
             log.date = log_date
-        log.save()
-
-        if self.logs.count() == 1:
-            self.date_modified = log.date.replace(tzinfo=pytz.utc)
-        else:
-            self.date_modified = self.logs.first().date
+        return log
 
+    def _touch(self, date, save=True):
+        """Set ``date_modified`` to ``date`` unless it is already later."""
+        if timezone.is_naive(date):
+            # Callers often pass e.g. datetime.utcnow()
+            date = timezone.make_aware(date, pytz.utc)
+        if self.date_modified is None or date > self.date_modified:
+            self.date_modified = date
         if save:
             self.save()
-        if user:
-            increment_user_activity_counters(user._primary_key, action, log.date.isoformat())
-
-        return log
+        else:
+            self.__class__.objects.filter(pk=self.pk).exclude(date_modified__gte=date).update(
+                date_modified=Greatest('date_modified', Value(date, output_field=models.DateTimeField()))
+            )
 
     class Meta:
         abstract = True
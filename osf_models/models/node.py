@@ -5,6 +5,7 @@ import operator
 import re
 import urlparse
 import warnings
+from collections import defaultdict
 
 from django.apps import apps
 from django.contrib.contenttypes.fields import GenericRelation
@@ -12,7 +13,9 @@ from datetime import datetime
 
 import pytz
 from django.core.exceptions import ValidationError
-from django.db import models, transaction
+from django.contrib.postgres.fields import ArrayField
+from django.db import connection, models, transaction
+from django.db.models.expressions import RawSQL
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
@@ -28,13 +31,19 @@ from osf_models.models.nodelog import NodeLog
 from osf_models.models.sanctions import RegistrationApproval
 from osf_models.models.user import OSFUser
 from osf_models.models.validators import validate_title
-from osf_models.modm_compat import Q
+from osf_models.modm_compat import Q, field_registry
 from osf_models.utils.auth import Auth, get_user
 from osf_models.utils.base import api_v2_url
 from osf_models.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
+from osf_models.utils.node_copy import (
+    NodeTree, copy_citations, copy_links, copy_nodes, copy_related_rows
+)
+from osf_models.utils.permission_resolver import PermissionResolver, get_permission_resolver
+from osf_models.utils.search_updater import search_updater
 from typedmodels.models import TypedModel
 
 from framework import status
+from framework.analytics import increment_user_activity_counters
 from framework.mongo.utils import to_mongo_key
 from framework.exceptions import PermissionsError
 from framework.sentry import log_exception
@@ -55,10 +64,86 @@ from website.util.permissions import (
     WRITE,
     ADMIN,
 )
-from .base import BaseModel, GuidMixin, Guid
+from .base import BaseIDManager, BaseModel, GuidMixin, Guid, MODMCompatibilityQuerySet
 
 logger = logging.getLogger(__name__)
 
+# Stands for a value that wasn't loaded
+_UNKNOWN = object()
+
+# Moves the subtree below a node along with it: the node's old ancestry (still in the
+# database) is replaced by its new ancestry in each descendant's ancestor_ids
+UPDATE_DESCENDANT_ANCESTRY_SQL = """
+UPDATE {table} SET
+    ancestor_ids = %(prefix)s || ancestor_ids[
+        COALESCE((SELECT array_length(ancestor_ids, 1) FROM {table} WHERE id = %(node)s), 0) + 2
+        :array_length(ancestor_ids, 1)
+    ],
+    root_id = %(root)s
+WHERE ancestor_ids @> ARRAY[%(node)s]
+"""
+
+# Ids of the nodes below the nodes that a user is an admin on
+ADMIN_DESCENDANT_IDS_SQL = """
+SELECT id FROM {node_table} WHERE ancestor_ids && ARRAY(
+    SELECT node_id FROM {contributor_table} WHERE user_id = %s AND admin
+)
+"""
+
+# Recomputes ancestor_ids and root_id for every node from parent_node_id
+REPAIR_ANCESTRY_SQL = """
+WITH RECURSIVE ancestry(id, ancestor_ids) AS (
+    SELECT id, ARRAY[]::integer[] FROM {table} WHERE parent_node_id IS NULL
+    UNION ALL
+    SELECT child.id, ancestry.ancestor_ids || ancestry.id FROM {table} AS child
+    JOIN ancestry ON child.parent_node_id = ancestry.id
+)
+UPDATE {table} AS node SET
+    ancestor_ids = ancestry.ancestor_ids,
+    root_id = COALESCE(ancestry.ancestor_ids[1], ancestry.id)
+FROM ancestry
+WHERE node.id = ancestry.id AND (
+    node.ancestor_ids IS DISTINCT FROM ancestry.ancestor_ids OR
+    node.root_id IS DISTINCT FROM COALESCE(ancestry.ancestor_ids[1], ancestry.id)
+)
+"""
+
+
+class AbstractNodeQuerySet(MODMCompatibilityQuerySet):
+
+    def readable_by(self, auth):
+        """Filter to the nodes that ``auth`` can view (see ``AbstractNode.can_view``):
+        public nodes, nodes the user can read as a contributor or as an admin on an
+        ancestor, and nodes with an active private link whose key ``auth`` has.
+        Anonymous private links give access to exactly the nodes they link.
+
+        :param Auth auth: May be None
+        """
+        if auth and getattr(auth.private_link, 'anonymous', False):
+            return self.filter(pk__in=auth.private_link.nodes.values('pk'))
+
+        readable = models.Q(is_public=True)
+        if not auth:
+            return self.filter(readable)
+        if auth.user:
+            readable |= models.Q(pk__in=Contributor.objects.filter(
+                models.Q(read=True) | models.Q(admin=True), user=auth.user
+            ).values('node_id'))
+            readable |= models.Q(pk__in=RawSQL(ADMIN_DESCENDANT_IDS_SQL.format(
+                node_table=AbstractNode._meta.db_table,
+                contributor_table=Contributor._meta.db_table,
+            ), [auth.user.pk]))
+        if auth.private_key:
+            PrivateLink = apps.get_model('osf_models.PrivateLink')
+            readable |= models.Q(pk__in=PrivateLink.objects.filter(
+                key=auth.private_key, is_deleted=False
+            ).values('nodes'))
+        return self.filter(readable)
+
+
+class AbstractNodeManager(BaseIDManager.from_queryset(AbstractNodeQuerySet)):
+    """Manager for nodes that adds the ``AbstractNodeQuerySet`` methods, e.g. ``readable_by``."""
+
 
 class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
                    NodeLinkMixin,
@@ -71,6 +156,8 @@ class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
     class Meta:
         order_with_respect_to = 'parent_node'
 
+    objects = AbstractNodeManager()
+
     #: Whether this is a pointer or not
     primary = True
 
@@ -106,6 +193,9 @@ class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
     PUBLIC = 'public'
 
     affiliated_institutions = models.ManyToManyField('Institution', related_name='nodes')
+    # Primary keys of this node's ancestors, root first. Kept in sync with parent_node by save;
+    # GIN indexed so that a node's descendants are one lookup (ancestor_ids__contains=[pk])
+    ancestor_ids = ArrayField(models.IntegerField(), default=list, blank=True)
     alternative_citations = models.ManyToManyField(AlternativeCitation, related_name='nodes')
     category = models.CharField(max_length=255,
                                 choices=CATEGORY_MAP.items(),
@@ -340,19 +430,14 @@ class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
         if doi:
             csl['DOI'] = doi
 
-        if self.logs:
-            csl['issued'] = datetime_to_csl(self.logs.latest().date)
+        newest = self.logs.newest(1)
+        if newest:
+            csl['issued'] = datetime_to_csl(newest[0].date)
 
         return csl
 
     def update_search(self):
-        from website import search
-
-        try:
-            search.search.update_node(self, bulk=False, async=True)
-        except search.exceptions.SearchUnavailableError as e:
-            logger.exception(e)
-            log_exception()
+        search_updater.update_node(self)
 
     def delete_search_entry(self):
         from website import search
@@ -394,9 +479,15 @@ class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
 
         return (self.is_public or
                 (auth.user and self.has_permission(auth.user, 'read')) or
-                auth.private_key in self.private_link_keys_active or
+                self._has_active_private_link(auth) or
                 self.is_admin_parent(auth.user))
 
+    def _has_active_private_link(self, auth):
+        resolver = get_permission_resolver(auth.user, self)
+        if resolver is not None:
+            return resolver.has_private_link(self, auth.private_key)
+        return auth.private_key in self.private_link_keys_active
+
     def can_edit(self, auth=None, user=None):
         """Return if a user is authorized to edit this node.
         Must specify one of (`auth`, `user`).
@@ -419,16 +510,26 @@ class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
         )
 
     def get_aggregate_logs_query(self, auth):
-        ids = [self._id] + [n._id
-                            for n in self.get_descendants_recursive()
-                            if n.can_view(auth)]
-        query = Q('node', 'in', ids) & Q('should_hide', 'ne', True)
+        # The readable descendants are a subquery, so the log feed is a single query
+        readable = AbstractNode.objects.filter(ancestor_ids__contains=[self.pk]).readable_by(auth)
+        query = (
+            (Q('node', 'eq', self) | Q('node', 'in', readable.values('pk'))) &
+            Q('should_hide', 'ne', True)
+        )
         return query
 
     def get_aggregate_logs_queryset(self, auth):
         query = self.get_aggregate_logs_query(auth)
         return NodeLog.find(query).sort('-date')
 
+    def get_aggregate_logs_page(self, auth, cursor=None, limit=10):
+        """Return a page of the logs of this node and its readable descendants, newest
+        first, using keyset pagination (see ``MODMCompatibilityQuerySet.seek``).
+
+        :return: tuple of the logs and the cursor for the next page (None on the last page)
+        """
+        return self.get_aggregate_logs_queryset(auth).seek(cursor, limit=limit)
+
     @property
     def comment_level(self):
         if self.public_comments:
@@ -470,6 +571,9 @@ class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
         :param str permission: Required permission
         :returns: User has required permission
         """
+        resolver = get_permission_resolver(user, self)
+        if resolver is not None:
+            return resolver.has_permission(self, permission, check_parent=check_parent)
         try:
             contrib = user.contributor_set.get(node=self)
         except Contributor.DoesNotExist:
@@ -493,11 +597,13 @@ class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
         return False
 
     def is_admin_parent(self, user):
-        if self.has_permission(user, 'admin', check_parent=False):
-            return True
-        if self.parent_node:
-            return self.parent_node.is_admin_parent(user)
-        return False
+        """Whether user is an admin on this node or any of its ancestors."""
+        resolver = get_permission_resolver(user, self)
+        if resolver is not None:
+            return resolver.is_admin_parent(self)
+        return Contributor.objects.filter(
+            node_id__in=[self.pk] + self.ancestor_ids, user=user, admin=True
+        ).exists()
 
     def set_permissions(self, user, permissions, validate=True, save=False):
         # Ensure that user's permissions cannot be lowered if they are the only admin
@@ -543,9 +649,19 @@ class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
 
     @property
     def license(self):
+        """This node's license, or else the license of its closest licensed ancestor."""
         node_license = self.node_license
-        if not node_license and self.parent_node:
-            return self.parent_node.license
+        if not node_license and self.ancestor_ids:
+            # Set by osf_models.utils.search_documents for nodes that are serialized in bulk
+            ancestors = getattr(self, '_prefetched_ancestors', None)
+            if ancestors is None:
+                ancestors = AbstractNode.objects.filter(
+                    node_license__isnull=False
+                ).select_related('node_license').without_guid().in_bulk(self.ancestor_ids)
+            for ancestor_id in reversed(self.ancestor_ids):
+                ancestor = ancestors.get(ancestor_id)
+                if ancestor is not None and ancestor.node_license_id is not None:
+                    return ancestor.node_license
         return node_license
 
     @property
@@ -851,19 +967,23 @@ class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
 
     @property
     def _root(self):
-        if self.parent_node:
-            return self.parent_node._root
-        else:
-            return self
+        if self.ancestor_ids:
+            return AbstractNode.objects.get(pk=self.ancestor_ids[0])
+        return self
+
+    def get_ancestors(self):
+        """Return this node's ancestors, closest first, using a single query."""
+        ancestors = AbstractNode.objects.in_bulk(self.ancestor_ids)
+        return [ancestors[pk] for pk in reversed(self.ancestor_ids) if pk in ancestors]
 
     def find_readable_antecedent(self, auth):
         """ Returns first antecendant node readable by <user>.
         """
-        next_parent = self.parent_node
-        while next_parent:
-            if next_parent.can_view(auth):
-                return next_parent
-            next_parent = next_parent.parent_node
+        ancestors = self.get_ancestors()
+        with PermissionResolver(getattr(auth, 'user', None), ancestors):
+            for ancestor in ancestors:
+                if ancestor.can_view(auth):
+                    return ancestor
 
     def copy_contributors_from(self, node):
         """Copies the contibutors from node (including permissions and visibility) into this node."""
@@ -875,93 +995,77 @@ class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
         Contributor.objects.bulk_create(contribs)
 
     def register_node(self, schema, auth, data, parent=None):
-        """Make a frozen copy of a node.
+        """Make a frozen copy of a node and its descendants. The registrations, their
+        contributors, licenses, tag and institution links and logs are created in bulk,
+        with a fixed number of queries regardless of the size of the tree.
 
         :param schema: Schema object
         :param auth: All the auth information including user, API key.
-        :param template: Template name
         :param data: Form data
         :param parent Node: parent registration of registration to be created
         """
-        # TODO(lyndsysimon): "template" param is not necessary - use schema.name?
-        # NOTE: Admins can register child nodes even if they don't have write access them
-        if not self.can_edit(auth=auth) and not self.is_admin_parent(user=auth.user):
-            raise PermissionsError(
-                'User {} does not have permission '
-                'to register this node'.format(auth.user._id)
-            )
-        if self.is_collection:
+        Registration = apps.get_model('osf_models.Registration')
+        user = auth.user
+        when = timezone.now()
+        tree = NodeTree.fetch(self)
+        original = tree.root
+
+        with PermissionResolver(user, tree.nodes):
+            # Deleted children aren't registered
+            originals = list(tree.walk(lambda node: not node.is_deleted))
+            for node in originals:
+                # NOTE: Admins can register child nodes even if they don't have write access them
+                if not node.can_edit(auth=auth) and not node.is_admin_parent(user=user):
+                    raise PermissionsError(
+                        'User {} does not have permission '
+                        'to register this node'.format(user._id)
+                    )
+        if original.is_collection:
             raise NodeStateError('Folders may not be registered')
-
-        original = self.load(self._primary_key)
-
-        # Note: Cloning a node will clone each node wiki page version and add it to
-        # `registered.wiki_pages_current` and `registered.wiki_pages_versions`.
         if original.is_deleted:
             raise NodeStateError('Cannot register deleted node.')
 
-        registered = original.clone()
-        registered.recast('osf_models.registration')
-        # Need to save here in order to set many-to-many fields
-        registered.save()
-
-        registered.registered_date = timezone.now()
-        registered.registered_user = auth.user
-        registered.registered_schema.add(schema)
-        registered.registered_from = original
-        if not registered.registered_meta:
-            registered.registered_meta = {}
-        registered.registered_meta[schema._id] = data
-
-        registered.copy_contributors_from(self)
-        registered.forked_from = self.forked_from
-        registered.creator = self.creator
-        registered.tags.add(*self.tags.all())
-        registered.affiliated_institutions.add(*self.affiliated_institutions.all())
-        # TODO: Uncomment when alternative citations are implemented
-        # registered.alternative_citations = self.alternative_citations
-        registered.node_license = original.license.copy() if original.license else None
-        registered.wiki_private_uuids = {}
-
-        # registered.save()
-
-        # Clone each log from the original node for this registration.
-        logs = original.logs.all()
-        for log in logs:
-            log.clone_node_log(registered._id)
-
-        registered.is_public = False
-        for node in registered.get_descendants_recursive():
-            node.is_public = False
-            node.save()
-
-        if parent:
-            registered.parent_node = parent
-
-        # After register callback
-        for addon in original.get_addons():
-            _, message = addon.after_register(original, registered, auth.user)
-            if message:
-                status.push_status_message(message, kind='info', trust=False)
+        def prepare(registered, node):
+            registered.registered_date = when
+            registered.registered_user = user
+            registered.registered_from = node
+            registered.registered_meta = dict(registered.registered_meta or {})
+            registered.registered_meta[schema._id] = data
+            registered.wiki_private_uuids = {}
+            registered.is_public = False
 
-        for node_contained in original.nodes.filter(is_deleted=False):
-            child_registration = node_contained.register_node(  # noqa
-                schema=schema,
-                auth=auth,
-                data=data,
-                parent=registered,
+        with transaction.atomic():
+            registrations = copy_nodes(
+                originals, prepare=prepare, copy_class=lambda node: Registration, parent=parent
             )
-            # TODO: Add links
-            # if child_registration and not child_registration.primary:
-            #     registered.nodes.append(child_registration)
+            copy_related_rows(Contributor, 'node', registrations)
+            copy_links('tags', registrations)
+            copy_links('affiliated_institutions', registrations)
+            schema_field = Registration._meta.get_field('registered_schema')
+            through = schema_field.remote_field.through
+            through.objects.bulk_create([
+                through(**{
+                    schema_field.m2m_field_name(): registered,
+                    schema_field.m2m_reverse_field_name(): schema,
+                })
+                for registered in registrations.values()
+            ])
+            # Clone each log from the original nodes for their registrations
+            NodeLog.bulk_clone_logs({pk: registered.pk for pk, registered in registrations.items()})
 
-        registered.save()
+        # After register callback
+        for node in originals:
+            for addon in node.get_addons():
+                _, message = addon.after_register(node, registrations[node.pk], user)
+                if message:
+                    status.push_status_message(message, kind='info', trust=False)
 
         if settings.ENABLE_ARCHIVER:
-            registered.refresh_from_db()
-            project_signals.after_create_registration.send(self, dst=registered, user=auth.user)
+            # Children are archived before their parents
+            for node in reversed(originals):
+                project_signals.after_create_registration.send(node, dst=registrations[node.pk], user=user)
 
-        return registered
+        return Registration.objects.get(pk=registrations[original.pk].pk)
 
     def _initiate_approval(self, user, notify_initiator_on_complete=False):
         end_date = timezone.now() + settings.REGISTRATION_APPROVAL_TIME
@@ -996,15 +1100,26 @@ class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
             save=True,
         )
 
-    # TODO optimize me
     def get_descendants_recursive(self, include=lambda n: True):
-        for node in self.nodes.all():
+        """Yield the descendants of this node depth-first, in child order, for which
+        ``include`` returns True. Children of nodes that aren't ``primary`` are skipped.
+        The whole subtree is fetched in a single query.
+        """
+        if self.pk is None:
+            return
+        children = defaultdict(list)
+        for node in AbstractNode.objects.filter(ancestor_ids__contains=[self.pk]):
+            children[node.parent_node_id].append(node)
+        for siblings in children.values():
+            siblings.sort(key=lambda node: (node._order, node.pk))
+
+        stack = list(reversed(children[self.pk]))
+        while stack:
+            node = stack.pop()
             if include(node):
                 yield node
             if node.primary:
-                for descendant in node.get_descendants_recursive(include):
-                    if include(descendant):
-                        yield descendant
+                stack.extend(reversed(children[node.pk]))
 
     @property
     def nodes_primary(self):
@@ -1030,9 +1145,105 @@ class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
                 self.save()
         return citation
 
-    # TODO: Optimize me (e.g. use bulk create)
     def fork_node(self, auth, title=None):
-        """Recursively fork a node.
+        """Fork a node along with the descendants that ``auth`` can read. The forks, their
+        contributors, licenses, tags, citations and logs are created in bulk, with a
+        fixed number of queries regardless of the size of the tree.
+
+        :param Auth auth: Consolidated authorization
+        :param str title: Optional text to prepend to forked title
+        :return: Forked node
+        """
+        PREFIX = 'Fork of '
+        user = auth.user
+        when = timezone.now()
+        tree = NodeTree.fetch(self)
+        original = tree.root
+
+        def can_fork(node):
+            return node.is_public or node.has_permission(user, READ)
+
+        with PermissionResolver(user, tree.nodes):
+            # Non-contributors can't fork private nodes
+            if not can_fork(original):
+                raise PermissionsError(
+                    '{0!r} does not have permission to fork node {1!r}'.format(user, self._id)
+                )
+            if original.is_deleted:
+                raise NodeStateError('Cannot fork deleted node.')
+            # Children that can't be forked are omitted from the result, along with their descendants
+            originals = list(tree.walk(lambda node: not node.is_deleted and can_fork(node)))
+
+        if title is None:
+            title = PREFIX + original.title
+        elif title == '':
+            title = original.title
+        validate_title(title)
+
+        def prepare(forked, node):
+            forked.title = title if node is original else node.title
+            forked.is_fork = True
+            forked.forked_date = when
+            # Like the NODE_FORKED log that each fork gets
+            forked.date_modified = when
+            forked.forked_from = node
+            forked.creator = user
+            forked.wiki_private_uuids = {}
+            # Forks default to private status
+            forked.is_public = False
+
+        def copy_class(node):
+            return Node if node.is_registration else node.__class__
+
+        with transaction.atomic():
+            forks = copy_nodes(originals, prepare=prepare, copy_class=copy_class)
+            Contributor.objects.bulk_create([
+                Contributor(user=user, node=forked, visible=True, read=True, write=True, admin=True, _order=0)
+                for forked in forks.values()
+            ])
+            copy_links('tags', forks)
+            copy_citations(forks)
+
+            originals_by_pk = {node.pk: node for node in originals}
+            fork_logs = []
+            for node in originals:
+                forked = forks[node.pk]
+                parent = originals_by_pk.get(node.parent_node_id)
+                fork_logs.append(NodeLog(
+                    action=NodeLog.NODE_FORKED,
+                    params={
+                        'parent_node': parent._id if parent else node.parent_id,
+                        'node': node._primary_key,
+                        'registration': forked._primary_key,  # TODO: Remove this in favor of 'fork'
+                        'fork': forked._primary_key,
+                    },
+                    user=user,
+                    node=forked,
+                    original_node=node,
+                    date=when,
+                ))
+            # Clone each log from the original nodes for their forks
+            NodeLog.bulk_clone_logs({pk: forked.pk for pk, forked in forks.items()})
+            NodeLog.bulk_create_with_guids(fork_logs)
+
+        for node in originals:
+            forked = forks[node.pk]
+            if forked.__class__ in (Node, Collection):
+                project_signals.project_created.send(forked)
+            project_signals.contributor_added.send(forked, contributor=user, auth=auth)
+            increment_user_activity_counters(user._primary_key, NodeLog.NODE_FORKED, when.isoformat())
+
+            # After fork callback
+            for addon in node.get_addons():
+                _, message = addon.after_fork(node, forked, user)
+                if message:
+                    status.push_status_message(message, kind='info', trust=True)
+
+        return AbstractNode.objects.get(pk=forks[original.pk].pk)
+
+    def _fork_node_recursive(self, auth, title=None):
+        """Fork a node and then each of its children, one node at a time. Superseded by
+        ``fork_node``, which gives the same result; kept for the benchmark_fork command.
 
         :param Auth auth: Consolidated authorization
         :param str title: Optional text to prepend to forked title
@@ -1078,11 +1289,13 @@ class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
         for node_contained in original.nodes.filter(is_deleted=False).all():
             forked_node = None
             try:  # Catch the potential PermissionsError above
-                forked_node = node_contained.fork_node(auth=auth, title='')
+                forked_node = node_contained._fork_node_recursive(auth=auth, title='')
             except PermissionsError:
                 pass  # If this exception is thrown omit the node from the result set
             if forked_node is not None:
-                forked.nodes.add(forked_node)
+                # Save (rather than nodes.add) so that the fork's ancestry is updated
+                forked_node.parent_node = forked
+                forked_node.save()
 
         if title is None:
             forked.title = PREFIX + original.title
@@ -1232,8 +1445,9 @@ class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
             visibility_removed = []
             to_retain = []
             to_remove = []
+            users_by_id = OSFUser.load_many(user_dict['id'] for user_dict in user_dicts)
             for user_dict in user_dicts:
-                user = OSFUser.load(user_dict['id'])
+                user = users_by_id[user_dict['id']]
                 if user is None:
                     raise ValueError('User not found')
                 if not self.contributors.filter(id=user.id).exists():
@@ -1311,10 +1525,63 @@ class AbstractNode(TypedModel, AddonModelMixin, IdentifierMixin,
             if to_remove or permissions_changed and ['read'] in permissions_changed.values():
                 project_signals.write_permissions_revoked.send(self)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        node = super(AbstractNode, cls).from_db(db, field_names, values)
+        # Deferred if not in __dict__, in which case save recomputes the ancestry
+        node._loaded_parent_node_id = node.__dict__.get('parent_node_id', _UNKNOWN)
+        return node
+
     def save(self, *args, **kwargs):
-        if self.pk:
-            self.root = self._root
-        return super(AbstractNode, self).save(*args, **kwargs)
+        moved = False
+        # The ancestry only needs recomputing (which costs a query for the parent) for new
+        # nodes and nodes whose parent changed.
+        # NOTE: _parent is assigned to parent_node by the set_parent pre_save signal
+        parent_changed = self.parent_node_id != getattr(self, '_loaded_parent_node_id', _UNKNOWN)
+        if self.pk is None or self._parent or parent_changed or self.root_id is None:
+            parent = self._parent or self.parent_node
+            ancestor_ids = parent.ancestor_ids + [parent.pk] if parent else []
+            moved = self.pk is not None and ancestor_ids != self.ancestor_ids
+            self.ancestor_ids = ancestor_ids
+            # New top level nodes are their own root, which is set once they have a pk
+            self._set_root_id(ancestor_ids[0] if ancestor_ids else self.pk)
+        with transaction.atomic():
+            if moved:
+                self._move_descendants(self.ancestor_ids)
+            ret = super(AbstractNode, self).save(*args, **kwargs)
+            if self.root_id is None:
+                self._set_root_id(self.pk)
+                AbstractNode.objects.filter(pk=self.pk).update(root_id=self.pk)
+        self._parent = None
+        self._loaded_parent_node_id = self.parent_node_id
+        return ret
+
+    def _set_root_id(self, root_id):
+        if self.root_id != root_id:
+            self.root_id = root_id
+            # Drop the cached root, which is for the old root_id
+            self.__dict__.pop(self._meta.get_field('root').get_cache_name(), None)
+
+    def _move_descendants(self, ancestor_ids):
+        """Update the ancestry of this node's descendants for its new ancestry. Must run
+        before this node is saved.
+        """
+        prefix = ancestor_ids + [self.pk]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                UPDATE_DESCENDANT_ANCESTRY_SQL.format(table=AbstractNode._meta.db_table),
+                {'prefix': prefix, 'node': self.pk, 'root': prefix[0]}
+            )
+
+    @classmethod
+    def repair_ancestry(cls):
+        """Recompute ``ancestor_ids`` and ``root`` for every node from ``parent_node``.
+
+        :return: The number of nodes that were out of sync
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(REPAIR_ANCESTRY_SQL.format(table=AbstractNode._meta.db_table))
+            return cursor.rowcount
 
     @classmethod
     def migrate_from_modm(cls, modm_obj):
@@ -1596,12 +1863,10 @@ class Node(AbstractNode):
         django_obj = cls()
         django_obj.guid = guid
 
-        bad_names = ['institution_logo_name']
-        local_django_fields = set(
-            [x.name for x in django_obj._meta.get_fields() if not x.is_relation and x.name not in bad_names])
+        bad_names = {'institution_logo_name'}
+        local_django_fields = field_registry.local_field_names(cls) - bad_names
 
-        intersecting_fields = set(modm_obj.to_storage().keys()).intersection(
-            set(local_django_fields))
+        intersecting_fields = local_django_fields.intersection(modm_obj.to_storage().keys())
 
         for field in intersecting_fields:
             modm_value = getattr(modm_obj, field)
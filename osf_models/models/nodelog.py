@@ -1,11 +1,117 @@
 from django.apps import apps
-from django.db import models
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.fields import ArrayField
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection, models
 from django.utils import timezone
 
 from website.util import api_v2_url
 
-from osf_models.models.base import BaseModel, ObjectIDMixin
+from osf_models.exceptions import ValidationError
+from osf_models.models.base import BaseIDManager, BaseModel, Guid, MODMCompatibilityQuerySet, ObjectIDMixin
+from osf_models.utils.base import generate_object_id
 from osf_models.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
+from osf_models.utils.nodelog_partitions import hot_cutoff
+
+# Clones logs onto other nodes, along with a Guid for each clone. The ids of the
+# clones are drawn from the sequence up front so that the Guids can point at them.
+CLONE_LOGS_SQL = """
+WITH clone AS (
+    SELECT source.log_id, source.object_id, source.node_id,
+        nextval(pg_get_serial_sequence('{log_table}', 'id')) AS id
+    FROM unnest(%s::integer[], %s::varchar[], %s::integer[]) AS source(log_id, object_id, node_id)
+), guid AS (
+    INSERT INTO {guid_table} (object_id, content_type_id, referent_pk)
+    SELECT object_id, %s, id FROM clone
+    RETURNING id, referent_pk
+)
+INSERT INTO {log_table} (id, guid_id, node_id, {columns})
+SELECT clone.id, guid.id, clone.node_id, {log_columns}
+FROM clone
+JOIN guid ON guid.referent_pk = clone.id
+JOIN {log_table} AS log ON log.id = clone.log_id
+RETURNING id
+"""
+
+# Inserts new logs along with a Guid for each, like CLONE_LOGS_SQL
+INSERT_LOGS_SQL = """
+WITH new_log AS (
+    SELECT nextval(pg_get_serial_sequence('{log_table}', 'id')) AS id, source.*
+    FROM (VALUES {values}) AS source(object_id, {columns})
+), guid AS (
+    INSERT INTO {guid_table} (object_id, content_type_id, referent_pk)
+    SELECT object_id, %s, id FROM new_log
+    RETURNING id, object_id
+), log AS (
+    INSERT INTO {log_table} (id, guid_id, {columns})
+    SELECT new_log.id, guid.id, {new_log_columns}
+    FROM new_log JOIN guid ON guid.object_id = new_log.object_id
+    RETURNING id, guid_id
+)
+SELECT guid.object_id, log.id, log.guid_id FROM log JOIN guid ON guid.id = log.guid_id
+"""
+
+# Params that almost every log has are stored in their own columns, named params_<key>
+PROMOTED_PARAMS = ('node', 'project', 'parent_node', 'contributors')
+
+
+def _is_promotable(key, value):
+    if key == 'contributors':
+        return isinstance(value, list) and all(isinstance(each, basestring) for each in value)
+    return isinstance(value, basestring)
+
+
+def split_params(params):
+    """Split ``params`` into the values of the promoted params columns and the rest.
+
+    :return: (dict mapping each promoted key to its value or None, dict of the other params)
+    """
+    promoted = dict.fromkeys(PROMOTED_PARAMS)
+    rest = {}
+    for key, value in (params or {}).items():
+        if key in promoted and _is_promotable(key, value):
+            promoted[key] = value
+        else:
+            rest[key] = value
+    return promoted, rest
+
+
+def merge_params(promoted, rest):
+    """Inverse of ``split_params``."""
+    params = dict(rest or {})
+    for key, value in promoted.items():
+        if value is not None:
+            params[key] = value
+    return params
+
+
+class NodeLogQuerySet(MODMCompatibilityQuerySet):
+
+    def newest(self, limit):
+        """Return the newest ``limit`` logs (as ``order_by('-date')[:limit]`` would), looking
+        in the NodeLog table itself before the older monthly partitions (see
+        ``osf_models.utils.nodelog_partitions``). The older partitions are only queried if
+        there aren't enough recent logs.
+        """
+        return self.order_by('-date')._first_rows(limit)
+
+    def _first_rows(self, count):
+        # Queries ordered newest first (e.g. the aggregate log feed, via ``seek``) look at
+        # the recent logs before the older partitions, like ``newest``
+        ordering = self.query.order_by
+        if not ordering and self.query.default_ordering:
+            ordering = self.query.get_meta().ordering
+        if not ordering or ordering[0] != '-date':
+            return super(NodeLogQuerySet, self)._first_rows(count)
+        cutoff = hot_cutoff(timezone.now())
+        rows = list(self.filter(models.Q(date__gte=cutoff) | models.Q(date__isnull=True))[:count])
+        if len(rows) < count:
+            rows.extend(self.filter(date__lt=cutoff)[:count - len(rows)])
+        return rows
+
+
+class NodeLogManager(BaseIDManager.from_queryset(NodeLogQuerySet)):
+    """Manager for logs that adds the ``NodeLogQuerySet`` methods, e.g. ``newest``."""
 
 
 class NodeLog(ObjectIDMixin, BaseModel):
@@ -16,6 +122,8 @@ class NodeLog(ObjectIDMixin, BaseModel):
     # /TODO DELETE ME POST MIGRATION
     DATE_FORMAT = '%m/%d/%Y %H:%M UTC'
 
+    objects = NodeLogManager()
+
     # Log action constants -- NOTE: templates stored in log_templates.mako
     CREATED_FROM = 'created_from'
 
@@ -126,7 +234,12 @@ class NodeLog(ObjectIDMixin, BaseModel):
     date = models.DateTimeField(default=timezone.now, db_index=True,
                                 null=True, blank=True)  # auto_now_add=True)
     action = models.CharField(max_length=255, db_index=True, choices=action_choices)
-    params = DateTimeAwareJSONField(default=dict)
+    # The params that aren't promoted to their own columns (see ``params``)
+    _params = DateTimeAwareJSONField(default=dict, blank=True, db_column='params')
+    params_node = models.CharField(max_length=255, null=True, blank=True)
+    params_project = models.CharField(max_length=255, null=True, blank=True)
+    params_parent_node = models.CharField(max_length=255, null=True, blank=True)
+    params_contributors = ArrayField(models.CharField(max_length=255), null=True, blank=True)
     should_hide = models.BooleanField(default=False)
     user = models.ForeignKey('OSFUser', related_name='logs', db_index=True, null=True, blank=True)
     foreign_user = models.CharField(max_length=255, null=True, blank=True)
@@ -139,6 +252,47 @@ class NodeLog(ObjectIDMixin, BaseModel):
     class Meta:
         ordering = ['-date']
         get_latest_by = 'date'
+        # For a node's logs by date, e.g. the aggregate log feed
+        index_together = (('node', 'date'), )
+
+    @property
+    def params(self):
+        """All of this log's params, including those stored in their own columns. Built on
+        first access; changes to the returned dict are stored when the log is saved.
+        """
+        if getattr(self, '_params_cache', None) is None:
+            self._params_cache = merge_params(
+                {key: getattr(self, 'params_{}'.format(key)) for key in PROMOTED_PARAMS},
+                self._params
+            )
+        return self._params_cache
+
+    @params.setter
+    def params(self, value):
+        self._params_cache = value
+        self._store_params()
+
+    def _store_params(self):
+        """Split the params (if they were accessed) into their columns."""
+        if getattr(self, '_params_cache', None) is None:
+            return
+        promoted, self._params = split_params(self._params_cache)
+        for key, value in promoted.items():
+            setattr(self, 'params_{}'.format(key), value)
+
+    def save(self, *args, **kwargs):
+        self._store_params()
+        return super(NodeLog, self).save(*args, **kwargs)
+
+    def refresh_from_db(self, *args, **kwargs):
+        self._params_cache = None
+        return super(NodeLog, self).refresh_from_db(*args, **kwargs)
+
+    @classmethod
+    def migrate_from_modm(cls, modm_obj):
+        django_obj = super(NodeLog, cls).migrate_from_modm(modm_obj)
+        django_obj.params = modm_obj.params
+        return django_obj
 
     @property
     def absolute_api_v2_url(self):
@@ -152,6 +306,103 @@ class NodeLog(ObjectIDMixin, BaseModel):
     def absolute_url(self):
         return self.absolute_api_v2_url
 
+    @classmethod
+    def insert_with_guids(cls, logs):
+        """Insert unsaved ``logs`` along with their Guids in a single statement. Like
+        ``bulk_create_with_guids``, this bypasses ``save``, but the logs are validated.
+
+        :return: ``logs``, with ``guid`` and ``pk`` set
+        """
+        logs = list(logs)
+        if not logs:
+            return logs
+        quote_name = connection.ops.quote_name
+        fields = [field for field in cls._meta.concrete_fields if field.name not in ('id', 'guid')]
+        columns = [quote_name(field.column) for field in fields]
+        row = '({})'.format(', '.join(
+            ['%s::varchar'] + ['%s::{}'.format(field.db_type(connection)) for field in fields]
+        ))
+        sql = INSERT_LOGS_SQL.format(
+            log_table=cls._meta.db_table,
+            guid_table=Guid._meta.db_table,
+            values=', '.join([row] * len(logs)),
+            columns=', '.join(columns),
+            new_log_columns=', '.join('new_log.{}'.format(column) for column in columns),
+        )
+        # Validate like save does, except for uniqueness and foreign keys, which cost a
+        # query per log and which the database enforces anyway
+        exclude = [field.name for field in cls._meta.concrete_fields if field.is_relation]
+        params = []
+        by_object_id = {}
+        for log in logs:
+            log._store_params()
+            try:
+                log.full_clean(exclude=exclude, validate_unique=False)
+            except DjangoValidationError as err:
+                raise ValidationError(*err.args)
+            object_id = generate_object_id()
+            by_object_id[object_id] = log
+            params.append(object_id)
+            params.extend(field.get_db_prep_save(getattr(log, field.attname), connection) for field in fields)
+        content_type = ContentType.objects.get_for_model(cls)
+        params.append(content_type.id)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for object_id, pk, guid_id in cursor.fetchall():
+                log = by_object_id[object_id]
+                log.pk = pk
+                log.guid = Guid(pk=guid_id, object_id=object_id, content_type=content_type, referent_pk=pk)
+                log.guid._cached_referent = log
+                log._state.adding = False
+        return logs
+
+    @classmethod
+    def clone_logs(cls, source_node, target_node, return_ids=False):
+        """Clone all of ``source_node``'s logs onto ``target_node`` (e.g. a fork or registration).
+
+        :param bool return_ids: Whether to also return the pks of the clones
+        :return: The number of logs cloned, and the pks of the clones if ``return_ids``
+        """
+        return cls.bulk_clone_logs({source_node.pk: target_node.pk}, return_ids=return_ids)
+
+    @classmethod
+    def bulk_clone_logs(cls, node_ids, return_ids=False):
+        """Clone the logs of many nodes with one query to find them and one ``INSERT ... SELECT``
+        that creates the clones and their Guids. New object ids are generated in bulk.
+
+        :param dict node_ids: Maps the pk of each node whose logs are cloned to the pk of
+            the node that gets the clones
+        :param bool return_ids: Whether to also return the pks of the clones
+        :return: The number of logs cloned, and the pks of the clones if ``return_ids``
+        """
+        logs = list(cls.objects.without_guid().filter(
+            node_id__in=list(node_ids.keys())
+        ).order_by('pk').values_list('pk', 'node_id'))
+        ids = []
+        if logs:
+            quote_name = connection.ops.quote_name
+            columns = [
+                quote_name(field.column) for field in cls._meta.concrete_fields
+                if field.name not in ('id', 'guid', 'node')
+            ]
+            sql = CLONE_LOGS_SQL.format(
+                log_table=cls._meta.db_table,
+                guid_table=Guid._meta.db_table,
+                columns=', '.join(columns),
+                log_columns=', '.join('log.{}'.format(column) for column in columns),
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [
+                    [log_id for log_id, _ in logs],
+                    [generate_object_id() for _ in logs],
+                    [node_ids[node_id] for _, node_id in logs],
+                    ContentType.objects.get_for_model(cls).id,
+                ])
+                ids = [row[0] for row in cursor.fetchall()]
+        if return_ids:
+            return len(ids), ids
+        return len(ids)
+
     def clone_node_log(self, node_id):
         """
         When a node is forked or registered, all logs on the node need to be
@@ -7,6 +7,8 @@ from osf_models.models import Node
 from osf_models.models import OSFUser
 from osf_models.models.base import BaseModel, ObjectIDMixin
 from osf_models.models.validators import validate_subscription_type
+from osf_models.modm_compat import field_registry
+from osf_models.utils.instrumentation import instrumented
 from website.notifications.constants import NOTIFICATION_TYPES
 
 
@@ -30,6 +32,7 @@ class NotificationSubscription(BaseModel):
     email_transactional = models.ManyToManyField('OSFUser', related_name='+')  # are pointless
 
     @classmethod
+    @instrumented('load')
     def load(cls, q):
         # modm doesn't throw exceptions when loading things that don't exist
         try:
@@ -49,10 +52,9 @@ class NotificationSubscription(BaseModel):
         django_obj = cls()
         django_obj._id = modm_obj._id
 
-        local_django_fields = set([x.name for x in django_obj._meta.get_fields() if not x.is_relation])
+        local_django_fields = field_registry.local_field_names(cls)
 
-        intersecting_fields = set(modm_obj.to_storage().keys()).intersection(
-            set(local_django_fields))
+        intersecting_fields = local_django_fields.intersection(modm_obj.to_storage().keys())
 
         for field in intersecting_fields:
             modm_value = getattr(modm_obj, field)
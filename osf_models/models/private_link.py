@@ -25,12 +25,16 @@ class PrivateLink(ObjectIDMixin, BaseModel):
         return self.nodes.filter(is_deleted=False).values_list('guid__guid', flat=True)
 
     def node_scale(self, node):
-        # node may be None if previous node's parent is deleted
-        if node is None or node.parent_id not in self.node_ids:
-            return -40
-        else:
-            offset = 20 if node.parent_node is not None else 0
-            return offset + self.node_scale(node.parent_node)
+        # 20px for each of node's closest ancestors that are in this link
+        scale = -40
+        if node is None:
+            return scale
+        linked_ids = set(self.nodes.filter(is_deleted=False).values_list('pk', flat=True))
+        for ancestor_id in reversed(node.ancestor_ids):
+            if ancestor_id not in linked_ids:
+                break
+            scale += 20
+        return scale
 
     def to_json(self):
         return {
@@ -3,6 +3,7 @@ import urlparse
 
 from django.utils import timezone
 from django.db import models
+from typedmodels.models import TypedModelManager
 
 from framework.auth import Auth
 from framework.exceptions import PermissionsError
@@ -20,17 +21,15 @@ from modularodm import Q as MQ
 # /TODO DELETE ME POST MIGRATION
 from osf_models.exceptions import ValidationValueError
 from osf_models.models.base import BaseModel, ObjectIDMixin
-from osf_models.models.node import AbstractNode
+from osf_models.models.node import AbstractNode, AbstractNodeManager
 from osf_models.models.nodelog import NodeLog
 from osf_models.utils.base import api_v2_url
 from osf_models.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 
-class RegistrationManager(models.Manager):
-    """Custom manager for registration that selects parent_node by default because
-    parent_node is used by the sanction-related properties, e.g. sanction, is_pending_embargo.
+class RegistrationManager(TypedModelManager, AbstractNodeManager):
+    """Manager for registrations that filters on the registration type and selects
+    the guid by default.
     """
-    def get_queryset(self):
-        return super(RegistrationManager, self).get_queryset().select_related('parent_node')
 
 class Registration(AbstractNode):
     # TODO DELETE ME POST MIGRATION
@@ -89,36 +88,60 @@ class Registration(AbstractNode):
     def archive_job(self):
         return self.archive_jobs.first() if self.archive_jobs.count() else None
 
+    SANCTION_FIELDS = ('embargo_termination_approval', 'retraction', 'embargo', 'registration_approval')
+
+    def _closest_with(self, *field_names):
+        """Return the closest of this registration and its ancestors that has any of
+        ``field_names`` set, or None. Sanctions are inherited from parent registrations,
+        so this looks up the ancestors in a single query instead of one per level.
+        """
+        def has_any(node):
+            return any(getattr(node, '{}_id'.format(field_name)) is not None for field_name in field_names)
+
+        # Set by osf_models.utils.search_documents for registrations that are serialized
+        # in bulk: this registration and its ancestors, with their sanctions
+        prefetched = getattr(self, '_prefetched_registrations', None)
+        node = self if prefetched is None else prefetched.get(self.pk, self)
+        if has_any(node):
+            return node
+        if prefetched is not None:
+            ancestors = prefetched
+        else:
+            ancestors = Registration.objects.select_related(*field_names).in_bulk(self.ancestor_ids)
+        for ancestor_id in reversed(self.ancestor_ids):
+            ancestor = ancestors.get(ancestor_id)
+            if ancestor is None:
+                # Not a registration; those have no sanctions
+                return None
+            if has_any(ancestor):
+                return ancestor
+        return None
+
     @property
     def sanction(self):
-        sanction = (
-            self.embargo_termination_approval or
-            self.retraction or
-            self.embargo or
-            self.registration_approval
-        )
-        if sanction:
-            return sanction
-        elif self.parent_node:
-            return self.parent_node.sanction
-        else:
+        node = self._closest_with(*self.SANCTION_FIELDS)
+        if node is None:
             return None
+        return (
+            node.embargo_termination_approval or
+            node.retraction or
+            node.embargo or
+            node.registration_approval
+        )
 
     @property
     def is_registration_approved(self):
-        if self.registration_approval is None:
-            if self.parent_node:
-                return self.parent_node.is_registration_approved
+        node = self._closest_with('registration_approval')
+        if node is None:
             return False
-        return self.registration_approval.is_approved
+        return node.registration_approval.is_approved
 
     @property
     def is_pending_embargo(self):
-        if self.embargo is None:
-            if self.parent_node:
-                return self.parent_node.is_pending_embargo
+        node = self._closest_with('embargo')
+        if node is None:
             return False
-        return self.embargo.is_pending_approval
+        return node.embargo.is_pending_approval
 
     @property
     def is_pending_embargo_for_existing_registration(self):
@@ -127,37 +150,33 @@ class Registration(AbstractNode):
         registrations pre-dating the Embargo feature do not get deleted if
         their respective Embargo request is rejected.
         """
-        if self.embargo is None:
-            if self.parent_node:
-                return self.parent_node.is_pending_embargo_for_existing_registration
+        node = self._closest_with('embargo')
+        if node is None:
             return False
-        return self.embargo.pending_registration
+        return node.embargo.pending_registration
 
     @property
     def is_retracted(self):
-        if self.retraction is None:
-            if self.parent_node:
-                return self.parent_node.is_retracted
+        node = self._closest_with('retraction')
+        if node is None:
             return False
-        return self.retraction.is_approved
+        return node.retraction.is_approved
 
     @property
     def is_pending_registration(self):
         if not self.is_registration:
             return False
-        if self.registration_approval is None:
-            if self.parent_node:
-                return self.parent_node.is_pending_registration
+        node = self._closest_with('registration_approval')
+        if node is None:
             return False
-        return self.registration_approval.is_pending_approval
+        return node.registration_approval.is_pending_approval
 
     @property
     def is_pending_retraction(self):
-        if self.retraction is None:
-            if self.parent_node:
-                return self.parent_node.is_pending_retraction
+        node = self._closest_with('retraction')
+        if node is None:
             return False
-        return self.retraction.is_pending_approval
+        return node.retraction.is_pending_approval
 
     @property
     def is_embargoed(self):
@@ -166,18 +185,17 @@ class Registration(AbstractNode):
         - that record has been approved
         - the node is not public (embargo not yet lifted)
         """
-        if self.embargo is None:
-            if self.parent_node:
-                return self.parent_node.is_embargoed
-        return self.embargo and self.embargo.is_approved and not self.is_public
+        node = self._closest_with('embargo')
+        if node is None:
+            return False
+        return node.embargo.is_approved and not node.is_public
 
     @property
     def embargo_end_date(self):
-        if self.embargo is None:
-            if self.parent_node:
-                return self.parent_node.embargo_end_date
+        node = self._closest_with('embargo')
+        if node is None:
             return False
-        return self.embargo.end_date
+        return node.embargo.end_date
 
     @property
     def archiving(self):
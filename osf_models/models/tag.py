@@ -1,4 +1,5 @@
 from django.db import models
+from osf_models.utils.instrumentation import instrumented
 
 from .base import BaseModel
 
@@ -23,6 +24,7 @@ class Tag(BaseModel):
         return self.name.lower()
 
     @classmethod
+    @instrumented('load')
     def load(cls, data):
         """For compatibility with v1: the tag name used to be the _id,
         so we make Tag.load('tagname') work as if `name` were the primary key.
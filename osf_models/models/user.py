@@ -27,11 +27,10 @@ from framework.auth.exceptions import (
     MergeConfirmedRequiredError
 )
 from framework.exceptions import PermissionsError
-from framework.sentry import log_exception
 from website import filters
 
 from osf_models.exceptions import reraise_django_validation_errors
-from osf_models.models.base import BaseModel, GuidMixin
+from osf_models.models.base import BaseIDManager, BaseModel, GuidMixin
 from osf_models.models.tag import Tag
 from osf_models.models.institution import Institution
 from osf_models.models.session import Session
@@ -41,6 +40,7 @@ from osf_models.models.contributor import RecentlyAddedContributor
 from osf_models.utils import security
 from osf_models.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 from osf_models.utils.names import impute_names
+from osf_models.utils.search_updater import search_updater
 from osf_models.modm_compat import Q
 
 logger = logging.getLogger(__name__)
@@ -62,7 +62,7 @@ name_formatters = {
     ),
 }
 
-class OSFUserManager(BaseUserManager):
+class OSFUserManager(BaseUserManager, BaseIDManager):
     def create_user(self, username, password=None):
         if not username:
             raise ValueError('Users must have a username')
@@ -769,13 +769,7 @@ class OSFUser(DirtyFieldsMixin, GuidMixin, BaseModel,
         return expiration
 
     def update_search(self):
-        from website.search.search import update_user
-        from website.search.exceptions import SearchUnavailableError
-        try:
-            update_user(self)
-        except SearchUnavailableError as e:
-            logger.exception(e)
-            log_exception()
+        search_updater.update_user(self)
 
     def update_search_nodes(self):
         """Call `update_search` on all nodes on which the user is a
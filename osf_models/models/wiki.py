@@ -240,10 +240,15 @@ class NodeWikiPage(GuidMixin, BaseModel):
         copy.wiki_pages_versions = {}
         copy.wiki_pages_current = {}
 
+        node_wikis = cls.load_many(
+            wiki_id
+            for key in node.wiki_pages_versions
+            for wiki_id in node.wiki_pages_versions[key]
+        )
         for key in node.wiki_pages_versions:
             copy.wiki_pages_versions[key] = []
             for wiki_id in node.wiki_pages_versions[key]:
-                node_wiki = NodeWikiPage.load(wiki_id)
+                node_wiki = node_wikis[wiki_id]
                 cloned_wiki = node_wiki.clone_wiki(copy._id)
                 copy.wiki_pages_versions[key].append(cloned_wiki._id)
                 if node_wiki.is_current:
@@ -2,10 +2,9 @@
 from operator import and_, or_
 
 from django.db.models import Q as DjangoQ
-from django.db.models import FieldDoesNotExist
 
 from modularodm import Q as MODMQ
-from modularodm.query import query, QueryGroup
+from modularodm.query import query, QueryGroup, RawQuery
 
 
 class BaseQ(object):
@@ -65,27 +64,12 @@ class Q(BaseQ, query.RawQuery):
             compound_cls = AndQ if query.operator == 'and' else OrQ
             return compound_cls.from_modm_query(query, model_cls=model_cls)
         elif isinstance(query, MODMQ):
-            attribute = query.attribute
             if model_cls:
-                field_aliases = getattr(model_cls, 'FIELD_ALIASES', {})
-                attribute = field_aliases.get(attribute, attribute)
-                field = _get_field(model_cls, attribute)
-                # Mongo compatibility fix: an 'eq' query on array fields
-                # behaves like 'contains' for postgres ArrayFields
-                # NOTE: GenericForeignKey does not implement get_internal_type
-                if (
-                    field and
-                    hasattr(field, 'get_internal_type') and
-                    field.get_internal_type() == 'ArrayField' and
-                    query.operator == 'eq'
-                ):
-                    return cls(attribute, 'contains', [query.argument])
-            return cls(attribute, query.operator, query.argument)
+                return cls.resolve(query, model_cls)
+            return cls(query.attribute, query.operator, query.argument)
         elif isinstance(query, cls):
             if model_cls:
-                field_aliases = getattr(model_cls, 'FIELD_ALIASES', {})
-                if query.attribute in field_aliases:
-                    return cls(field_aliases[query.attribute], query.operator, query.argument)
+                return cls.resolve(query, model_cls)
             return query
         else:
             raise ValueError(
@@ -93,6 +77,16 @@ class Q(BaseQ, query.RawQuery):
                 'or osf_models.modm_compat.Q object'
             )
 
+    @classmethod
+    def resolve(cls, query, model_cls):
+        """Translate a modm or compat ``Q`` on a single attribute for ``model_cls``."""
+        field_info = field_registry.resolve(model_cls, query.attribute)
+        # Mongo compatibility fix: an 'eq' query on array fields
+        # behaves like 'contains' for postgres ArrayFields
+        if query.operator == 'eq' and field_info.eq_lookup == 'contains':
+            return cls(field_info.name, 'contains', [query.argument], lookup=field_info.lookup)
+        return cls(field_info.name, query.operator, query.argument, lookup=field_info.lookup)
+
     @property
     def operator(self):
         return self.__op
@@ -123,30 +117,203 @@ class Q(BaseQ, query.RawQuery):
             return True if self.__op == 'eq' else False
         return self.__val
 
-    def __init__(self, key, op, val):
+    @property
+    def lookup(self):
+        """The Django lookup path for the attribute, as resolved by the field registry
+        when the query was made for a model.
+        """
+        if self.__lookup is not None:
+            return self.__lookup
+        return '__'.join(self.key.split('.'))
+
+    def __init__(self, key, op, val, lookup=None):
         self.__op = op
         self.__key = key
         self.__val = val
+        self.__lookup = lookup
 
     def to_django_query(self):
         if self.op == 'ne':
-            return ~DjangoQ(**{'__'.join(self.key.split('.')): self.val})
-        return DjangoQ(**{'__'.join(self.key.split('.') + [self.op]): self.val})
+            return ~DjangoQ(**{self.lookup: self.val})
+        return DjangoQ(**{'{}__{}'.format(self.lookup, self.op): self.val})
 
     def __repr__(self):
         return '<Q({}, {}, {})>'.format(self.key, self.op, self.val)
 
-def _get_field(model_cls, field_name):
-    # Prevent circular import
-    from osf_models.models.base import BaseIDMixin
-    if issubclass(model_cls, BaseIDMixin) and field_name == '_id':
-        field_name = 'guid'
-    try:
-        return model_cls._meta.get_field(field_name)
-    except FieldDoesNotExist:
+class FieldInfo(object):
+    """Resolved metadata for a modm attribute name on a model.
+
+    :param str name: Attribute name after ``FIELD_ALIASES`` (as used in compat Q objects)
+    :param str lookup: Django lookup path for the attribute
+    :param field: The Django field, or None if the attribute isn't a field
+    :param str internal_type: The field's internal type (e.g. 'ArrayField', 'JSONField', 'ForeignKey')
+    :param str eq_lookup: Django lookup that a modm 'eq' query on the attribute translates to
+    """
+    __slots__ = ('name', 'lookup', 'field', 'internal_type', 'eq_lookup')
+
+    def __init__(self, name, field=None):
+        self.name = name
+        self.lookup = 'pk' if name == '_id' else '__'.join(name.split('.'))
+        self.field = field
+        # NOTE: GenericForeignKey does not implement get_internal_type
+        self.internal_type = field.get_internal_type() if hasattr(field, 'get_internal_type') else None
+        self.eq_lookup = 'contains' if self.internal_type == 'ArrayField' else 'exact'
+
+    def __repr__(self):
+        return '<FieldInfo({}, {}, {})>'.format(self.name, self.lookup, self.internal_type)
+
+
+class ModelFields(object):
+    """Field metadata for one model, keyed by modm attribute name."""
+
+    def __init__(self, model_cls):
+        # Prevent circular import
+        from osf_models.models.base import BaseIDMixin
+
+        all_fields = model_cls._meta.get_fields()
+        by_name = {field.name: field for field in all_fields}
+        self.aliases = getattr(model_cls, 'FIELD_ALIASES', {})
+        self.fields = {name: FieldInfo(name, field) for name, field in by_name.items()}
+        for attribute, alias in self.aliases.items():
+            self.fields[attribute] = FieldInfo(alias, by_name.get(alias))
+        if issubclass(model_cls, BaseIDMixin):
+            self.fields['_id'] = FieldInfo('_id', by_name.get('guid'))
+        self.local_field_names = frozenset(field.name for field in all_fields if not field.is_relation)
+
+    def resolve(self, attribute):
+        try:
+            return self.fields[attribute]
+        except KeyError:
+            # Not a field (e.g. a dotted path into a related model); remember that too
+            info = self.fields[attribute] = FieldInfo(self.aliases.get(attribute, attribute))
+            return info
+
+
+class FieldRegistry(object):
+    """Per-model map of modm attribute names to resolved field metadata. Populated
+    for every model when the app is ready; other models are added on first use.
+    """
+
+    def __init__(self):
+        self._models = {}
+
+    def populate(self, models):
+        for model_cls in models:
+            self._models[model_cls] = ModelFields(model_cls)
+
+    def get(self, model_cls):
+        try:
+            return self._models[model_cls]
+        except KeyError:
+            model_fields = self._models[model_cls] = ModelFields(model_cls)
+            return model_fields
+
+    def resolve(self, model_cls, attribute):
+        return self.get(model_cls).resolve(attribute)
+
+    def local_field_names(self, model_cls):
+        """Names of the model's non-relational fields (for migrate_from_modm)."""
+        return self.get(model_cls).local_field_names
+
+field_registry = FieldRegistry()
+
+
+class Slot(object):
+    """Placeholder for the n-th argument of a query in a compiled Django query."""
+    __slots__ = ('index', )
+
+    def __init__(self, index):
+        self.index = index
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return '<Slot({})>'.format(self.index)
+
+
+class QueryCache(object):
+    """Caches Django queries compiled from modular-odm queries, keyed on the model
+    and the shape of the query (attributes, operators, and which arguments are None).
+    A cache hit only binds the query's arguments into the compiled Django query.
+    """
+
+    def __init__(self, max_size=2048):
+        self.max_size = max_size
+        self.clear()
+
+    def clear(self):
+        self._compiled = {}
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {'size': len(self._compiled), 'hits': self.hits, 'misses': self.misses}
+
+    def to_django_query(self, query, model_cls=None):
+        arguments = []
+        shape = self._shape(query, arguments)
+        if shape is None:
+            # Not a query we know how to take apart; translate without caching
+            return Q.from_modm_query(query, model_cls=model_cls).to_django_query()
+        key = (model_cls, shape)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            self.misses += 1
+            if len(self._compiled) >= self.max_size:
+                self._compiled.clear()
+            compiled = self._compiled[key] = self._compile(query, model_cls, [0])
+        else:
+            self.hits += 1
+        return self._bind(compiled, arguments)
+
+    def _shape(self, query, arguments):
+        if isinstance(query, QueryGroup):
+            nodes = tuple(self._shape(node, arguments) for node in query.nodes)
+            if None in nodes:
+                return None
+            return (query.operator, nodes)
+        elif isinstance(query, RawQuery):
+            if query.argument is None:
+                return (query.__class__, query.attribute, query.operator, None)
+            arguments.append(query.argument)
+            return (query.__class__, query.attribute, query.operator)
         return None
 
+    def _compile(self, query, model_cls, counter):
+        if isinstance(query, QueryGroup):
+            op_function = and_ if query.operator == 'and' else or_
+            return reduce(op_function, (self._compile(node, model_cls, counter) for node in query.nodes))
+        argument = query.argument
+        if argument is not None:
+            argument = Slot(counter[0])
+            counter[0] += 1
+        placeholder = query.__class__(query.attribute, query.operator, argument)
+        return Q.from_modm_query(placeholder, model_cls=model_cls).to_django_query()
+
+    def _bind(self, compiled, arguments):
+        bound = DjangoQ()
+        bound.connector = compiled.connector
+        bound.negated = compiled.negated
+        for child in compiled.children:
+            if isinstance(child, DjangoQ):
+                bound.children.append(self._bind(child, arguments))
+            else:
+                lookup, value = child
+                bound.children.append((lookup, self._bind_value(value, arguments)))
+        return bound
+
+    def _bind_value(self, value, arguments):
+        if isinstance(value, Slot):
+            return arguments[value.index]
+        # e.g. an 'eq' query on an ArrayField becomes 'contains' [argument]
+        if isinstance(value, list) and any(isinstance(each, Slot) for each in value):
+            return [self._bind_value(each, arguments) for each in value]
+        return value
+
+query_cache = QueryCache()
+
 def to_django_query(query, model_cls=None):
     """Translate a modular-odm Q or QueryGroup to a Django query.
     """
-    return Q.from_modm_query(query, model_cls=model_cls).to_django_query()
+    return query_cache.to_django_query(query, model_cls=model_cls)
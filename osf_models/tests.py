@@ -2,8 +2,23 @@ import datetime as dt
 import json
 from decimal import Decimal
 
-from django.test import TestCase
+import pytz
+from django.contrib.postgres.fields import ArrayField
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection, models, transaction
+from django.db.models import Q as DjangoQ
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from osf_models.modm_compat import FieldRegistry, Q, QueryCache
 from osf_models.utils.datetime_aware_jsonfield import DateTimeAwareJSONEncoder, decode_datetime_objects
+from osf_models.utils.guid_pool import GuidPool, GuidPoolExhausted
+from osf_models.utils.identity_map import get_identity_map, identity_map, identity_mapped
+from osf_models.utils.instrumentation import instrumentation, instrumented, MemorySink
+from osf_models.utils.keyset import decode_cursor, encode_cursor, keyset_filter, keyset_keys, keyset_values
+from osf_models.utils.node_copy import NodeTree
+from osf_models.utils.nodelog_partitions import hot_cutoff, month_start
+from osf_models.utils.search_updater import MemorySearchBackend, SearchUpdateBuffer, SearchUpdater
 
 
 class DateTimeAwareJSONFieldTests(TestCase):
@@ -66,3 +81,527 @@ class DateTimeAwareJSONFieldTests(TestCase):
         json_string = json.dumps(self.json_list_data, cls=DateTimeAwareJSONEncoder)
         json_data = decode_datetime_objects(json.loads(json_string))
         assert json_data == self.json_list_data, 'Nope'
+
+
+class StaticGuidPool(GuidPool):
+    """GuidPool that claims blocks without touching the database."""
+    used = set()
+
+    def _claim_block(self):
+        start = self.refills * self.batch_size
+        return [self._nth_guid(n) for n in range(start, start + self.batch_size)]
+
+    def _exclude_used(self, candidates):
+        return [each for each in candidates if each not in self.used]
+
+
+class GuidPoolTests(SimpleTestCase):
+    def test_keyspace_permutation_does_not_repeat(self):
+        pool = GuidPool(3, 'abcdefg', batch_size=10, secret='secret')
+        guids = [pool._nth_guid(n) for n in range(pool.keyspace_size)]
+        assert pool.keyspace_size == 7 * 6 * 5
+        assert len(set(guids)) == pool.keyspace_size
+        assert all(len(set(each)) == 3 and set(each) <= set('abcdefg') for each in guids)
+
+    def test_permutation_depends_on_the_secret(self):
+        pools = [GuidPool(5, '23456789abcdefghjkmnpqrstuvwxyz', secret=secret) for secret in ('one', 'two')]
+        assert [pools[0]._nth_guid(n) for n in range(10)] != [pools[1]._nth_guid(n) for n in range(10)]
+
+    def test_take_skips_used_guids_and_tracks_hits(self):
+        pool = StaticGuidPool(5, '23456789abcdefghjkmnpqrstuvwxyz', batch_size=4, secret='secret')
+        pool.used = {pool._nth_guid(0)}
+        taken = [pool.take() for _ in range(6)]
+        assert len(set(taken)) == 6
+        assert pool._nth_guid(0) not in taken
+        assert pool.refills == 2
+        assert pool.misses == 2
+        assert pool.hits == 4
+        assert pool.discarded == 1
+
+    def test_take_gives_up_when_every_candidate_is_used(self):
+        pool = StaticGuidPool(3, 'abcdefg', batch_size=4, secret='secret')
+        pool.used = {pool._nth_guid(n) for n in range(pool.keyspace_size)}
+        with self.assertRaises(GuidPoolExhausted):
+            pool.take()
+
+
+class FakeModel(object):
+    loads = 0
+
+    def __init__(self, pk):
+        self.pk = pk
+
+    @classmethod
+    @identity_mapped
+    def load(cls, data):
+        cls.loads += 1
+        return cls(pk=int(data))
+
+FakeModel._meta = type('Options', (object, ), {'concrete_model': FakeModel})
+
+
+class IdentityMapTests(SimpleTestCase):
+    def test_load_returns_materialized_instance_while_active(self):
+        assert FakeModel.load('1') is not FakeModel.load('1')
+        with identity_map():
+            loads = FakeModel.loads
+            first = FakeModel.load('1')
+            assert FakeModel.load('1') is first
+            assert FakeModel.loads == loads + 1
+        assert get_identity_map() is None
+
+    def test_saving_another_instance_invalidates_entry(self):
+        with identity_map() as mapped:
+            first = FakeModel.load('1')
+            mapped.saved(FakeModel(pk=1))
+            assert FakeModel.load('1') is not first
+
+
+class QueryCacheTests(SimpleTestCase):
+    def test_cache_hit_binds_new_arguments(self):
+        cache = QueryCache()
+        query = (Q('title', 'eq', 'foo') & Q('is_public', 'ne', True)) | Q('parent_node', 'eq', None)
+        assert str(cache.to_django_query(query)) == str(Q.from_modm_query(query).to_django_query())
+
+        query = (Q('title', 'eq', 'bar') & Q('is_public', 'ne', False)) | Q('parent_node', 'eq', None)
+        assert str(cache.to_django_query(query)) == str(Q.from_modm_query(query).to_django_query())
+        assert cache.stats() == {'size': 1, 'hits': 1, 'misses': 1}
+
+    def test_none_arguments_change_the_shape(self):
+        cache = QueryCache()
+        cache.to_django_query(Q('parent_node', 'eq', None))
+        django_query = cache.to_django_query(Q('parent_node', 'eq', 3))
+        assert django_query.children == [('parent_node__exact', 3)]
+        assert cache.misses == 2
+
+
+def named_field(name, field):
+    field.set_attributes_from_name(name)
+    return field
+
+
+class FakeFieldsModel(object):
+    FIELD_ALIASES = {'tag_names': 'tags'}
+    _meta = type('Options', (object, ), {'get_fields': staticmethod(lambda: [
+        named_field('title', models.TextField()),
+        named_field('tags', ArrayField(models.CharField(max_length=255))),
+    ])})
+
+
+class FieldRegistryTests(SimpleTestCase):
+    def test_resolves_aliases_and_array_fields(self):
+        registry = FieldRegistry()
+        info = registry.resolve(FakeFieldsModel, 'tag_names')
+        assert (info.name, info.internal_type, info.eq_lookup) == ('tags', 'ArrayField', 'contains')
+        assert registry.resolve(FakeFieldsModel, 'title').eq_lookup == 'exact'
+        assert registry.resolve(FakeFieldsModel, 'node.title').lookup == 'node__title'
+        assert registry.local_field_names(FakeFieldsModel) == {'title', 'tags'}
+
+    def test_queries_use_the_resolved_lookup(self):
+        def translate(query):
+            return Q.from_modm_query(query, model_cls=FakeFieldsModel).to_django_query().children
+
+        assert translate(Q('node.title', 'eq', 'x')) == [('node__title__exact', 'x')]
+        assert translate(Q('tag_names', 'eq', 'a')) == [('tags__contains', ['a'])]
+
+
+def get_keyset_row_field(name):
+    fields = {
+        'date': named_field('date', models.DateTimeField()),
+        'node': named_field('node', models.ForeignKey('self')),
+    }
+    if name not in fields:
+        raise FieldDoesNotExist(name)
+    return fields[name]
+
+
+class FakeKeysetRow(object):
+    _meta = type('Options', (object, ), {'get_field': staticmethod(get_keyset_row_field)})
+    date = 'today'
+    node_id = 5
+    pk = 42
+
+    @property
+    def node(self):
+        raise AssertionError('The related row was fetched')
+
+
+class KeysetTests(SimpleTestCase):
+    def test_keys_get_a_pk_tie_breaker(self):
+        assert keyset_keys(['-date', 'action']) == ['-date', 'action', 'pk']
+        assert keyset_keys(['-date', '-id'], pk_name='id') == ['-date', '-id']
+        with self.assertRaises(ValueError):
+            keyset_keys(['?'])
+
+    def test_filter_with_mixed_directions(self):
+        query = keyset_filter(['-date', 'pk'], [3, 7])
+        assert str(query) == str(DjangoQ(date__lt=3) | (DjangoQ(pk__gt=7) & DjangoQ(date=3)))
+
+    def test_cursor_round_trip(self):
+        keys = ['-date', 'pk']
+        values = [dt.datetime(2016, 9, 14, 12, 30), 42]
+        assert decode_cursor(encode_cursor(keys, values), keys) == values
+        with self.assertRaises(ValueError):
+            decode_cursor(encode_cursor(keys, values), ['date', 'pk'])
+        with self.assertRaises(ValueError):
+            decode_cursor('not a cursor', keys)
+
+    def test_values_read_foreign_keys_from_their_column(self):
+        assert keyset_values(FakeKeysetRow(), ['-date', 'node', 'pk']) == ['today', 5, 42]
+
+
+class InstrumentedModel(object):
+    @classmethod
+    @instrumented('load')
+    def load(cls, data):
+        instrumentation.record_query(None, 'SELECT 1', None, 0.25, 1)
+        return data
+
+
+class InstrumentationTests(SimpleTestCase):
+    def setUp(self):
+        self.sink = MemorySink()
+
+    def tearDown(self):
+        instrumentation.configure()
+
+    def test_records_queries_per_call_site(self):
+        instrumentation.configure(sinks=[self.sink], slow_query_seconds=0.1, explain_slow_queries=False)
+        InstrumentedModel.load('abc12')
+        call, = self.sink.calls
+        assert (call.model, call.entry_point, call.queries, call.rows) == ('InstrumentedModel', 'load', 1, 1)
+        assert call.db_seconds == 0.25
+        assert 'test_records_queries_per_call_site' in call.call_site
+        slow_query, = self.sink.slow_queries
+        assert slow_query.call is call and slow_query.plan is None
+
+    def test_sampling(self):
+        instrumentation.configure(sinks=[self.sink], sample_rate=0)
+        InstrumentedModel.load('abc12')
+        assert self.sink.calls == []
+        assert not instrumentation.is_recording()
+
+
+class FakeNode(object):
+    def __init__(self, pk, parent_node_id=None, _order=0):
+        self.pk = pk
+        self.parent_node_id = parent_node_id
+        self._order = _order
+
+
+class NodeTreeTests(SimpleTestCase):
+    def test_walk_is_depth_first_in_child_order_and_prunes(self):
+        tree = NodeTree(FakeNode(1), [
+            FakeNode(4, 1, _order=1), FakeNode(2, 1, _order=0), FakeNode(3, 2),
+            FakeNode(5, 4), FakeNode(6, 5),
+        ])
+        assert [node.pk for node in tree.walk()] == [1, 2, 3, 4, 5, 6]
+        assert [node.pk for node in tree.walk(lambda node: node.pk != 5)] == [1, 2, 3, 4]
+
+
+class NodeLogPartitionTests(SimpleTestCase):
+    def test_month_arithmetic_crosses_years(self):
+        date = dt.datetime(2016, 2, 14, 12, 30, tzinfo=pytz.utc)
+        assert month_start(date) == dt.datetime(2016, 2, 1, tzinfo=pytz.utc)
+        assert month_start(date, months_ago=3) == dt.datetime(2015, 11, 1, tzinfo=pytz.utc)
+        assert month_start(date, months_ago=-11) == dt.datetime(2017, 1, 1, tzinfo=pytz.utc)
+        assert hot_cutoff(date) == dt.datetime(2015, 11, 1, tzinfo=pytz.utc)
+
+
+class SearchUpdaterTests(SimpleTestCase):
+    def setUp(self):
+        self.backend = MemorySearchBackend()
+        self.updater = SearchUpdater()
+        self.updater.configure(coalesce=True, backend=self.backend)
+
+    def test_flush_sends_each_node_and_user_once(self):
+        buffer = SearchUpdateBuffer()
+        first, second = FakeNode(1), FakeNode(2)
+        latest = FakeNode(1)
+        for node in (first, second, first, latest):
+            buffer.add_node(node)
+        buffer.add_user(FakeNode(7))
+        self.updater.flush(buffer)
+        assert self.backend.node_updates == [[second, latest]]
+        assert [[user.pk for user in users] for users in self.backend.user_updates] == [[7]]
+        assert self.updater.stats() == {'requested': 5, 'coalesced': 2, 'emitted': 3}
+
+    def test_updates_are_sent_right_away_when_not_coalescing(self):
+        self.updater.configure(coalesce=False, backend=self.backend)
+        node = FakeNode(1)
+        self.updater.update_node(node)
+        self.updater.update_node(node)
+        assert self.backend.node_updates == [[node], [node]]
+        assert self.updater.stats() == {'requested': 2, 'coalesced': 0, 'emitted': 2}
+
+
+class SearchUpdaterTransactionTests(TestCase):
+    def test_updates_survive_a_rolled_back_savepoint(self):
+        backend = MemorySearchBackend()
+        updater = SearchUpdater()
+        updater.configure(coalesce=True, backend=backend)
+        first, second = FakeNode(1), FakeNode(2)
+        try:
+            with transaction.atomic():
+                updater.update_node(first)
+                raise ValueError
+        except ValueError:
+            pass
+        updater.update_node(second)
+        assert backend.node_updates == []
+        # TestCase never commits
+        for _, func in connection.run_on_commit:
+            func()
+        assert backend.node_updates == [[first, second]]
+
+
+def make_user(username='user@example.com'):
+    from osf_models.models import OSFUser
+    user = OSFUser.create(username=username, password='password', fullname='Test User')
+    user.is_registered = True
+    user.save()
+    return user
+
+
+def make_project(user, title='Project', **kwargs):
+    from osf_models.models import Node
+    node = Node(title=title, creator=user, category='project', **kwargs)
+    node.save()
+    return node
+
+
+class ForkNodeTests(TestCase):
+    def test_fork_dates(self):
+        from osf_models.utils.auth import Auth
+        user = make_user()
+        project = make_project(user)
+        make_project(user, title='Component', parent_node=project)
+        old = timezone.now() - dt.timedelta(days=30)
+        node_ids = [project.pk] + [child.pk for child in project.nodes.all()]
+        type(project).objects.filter(pk__in=node_ids).update(date_created=old, date_modified=old)
+        project.refresh_from_db()
+
+        fork = project.fork_node(Auth(user))
+        forks = [fork] + list(fork.get_descendants_recursive())
+        assert len(forks) == 2
+        for forked in forks:
+            assert forked.date_created == old
+            assert forked.date_modified == forked.forked_date
+            assert forked.date_modified > old
+
+
+class LogWriterTests(TestCase):
+    def test_buffered_logs_are_written_on_commit(self):
+        from osf_models.models import NodeLog
+        from osf_models.utils.auth import Auth
+        from osf_models.utils.log_writer import log_writer
+        user = make_user()
+        project = make_project(user)
+        counted = []
+        log_writer.configure(buffered=True, increment_activity=counted.extend)
+        self.addCleanup(log_writer.configure)
+
+        log = project.add_log(NodeLog.TAG_ADDED, {'tag': 'foo'}, auth=Auth(user), save=False)
+        assert log.pk is None
+        assert counted == []
+        # TestCase never commits
+        for _, func in connection.run_on_commit:
+            func()
+        assert NodeLog.objects.get(pk=log.pk).action == NodeLog.TAG_ADDED
+        assert counted == [log]
+
+
+class NodeLogHotFirstTests(TestCase):
+    def test_seek_pages_across_the_hot_cutoff(self):
+        from osf_models.models import NodeLog
+        user = make_user()
+        project = make_project(user)
+        project.logs.all().delete()
+        now = timezone.now()
+        for days in (0, 1, 40, 100, 200, 400):
+            NodeLog(action=NodeLog.TAG_ADDED, params={'node': project._id}, node=project, user=user,
+                    date=now - dt.timedelta(days=days)).save()
+        expected = list(project.logs.order_by('-date', 'pk').values_list('pk', flat=True))
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = project.logs.all().sort('-date').seek(cursor, limit=4)
+            seen.extend(log.pk for log in page)
+            if cursor is None:
+                break
+        assert seen == expected
+        assert [log.pk for log in project.logs.newest(5)] == expected[:5]
+
+
+class NodeAncestryTests(TestCase):
+    def test_ancestry_is_only_recomputed_when_the_parent_changes(self):
+        from osf_models.models import Node
+        user = make_user()
+        project = make_project(user)
+        other = make_project(user, title='Other')
+        component = make_project(user, title='Component', parent_node=project)
+        assert component.ancestor_ids == [project.pk]
+
+        component = Node.objects.get(pk=component.pk)
+        component.title = 'Renamed'
+        component.save()
+        # The parent wasn't fetched
+        assert not hasattr(component, '_parent_node_cache')
+        assert component.ancestor_ids == [project.pk]
+
+        component.parent_node = other
+        component.save()
+        assert Node.objects.get(pk=component.pk).ancestor_ids == [other.pk]
+
+    def test_new_nodes_get_their_root(self):
+        from osf_models.models import Node
+        user = make_user()
+        project = make_project(user)
+        component = make_project(user, title='Component', parent_node=project)
+        assert project.root_id == project.pk
+        assert component.root_id == project.pk
+        assert Node.objects.get(pk=project.pk).root_id == project.pk
+        assert Node.objects.get(pk=component.pk).root_id == project.pk
+        assert component.root == project
+
+
+class NodeDocumentsTests(TestCase):
+    def make_trees(self, user, count):
+        from osf_models.utils.auth import Auth
+        for i in range(count):
+            project = make_project(user, title='Project {}'.format(i), is_public=True)
+            project.add_tag('tag{}'.format(i), auth=Auth(user), log=False)
+            make_project(user, title='Component {}'.format(i), parent_node=project, is_public=True)
+
+    def count_queries(self, queryset, chunk_size):
+        from osf_models.utils.search_documents import node_documents
+        with CaptureQueriesContext(connection) as queries:
+            documents = list(node_documents(queryset, chunk_size=chunk_size))
+        return len(documents), len(queries)
+
+    def test_queries_per_chunk_do_not_depend_on_the_number_of_nodes(self):
+        from osf_models.models import Node
+        user = make_user()
+        self.make_trees(user, 2)
+        few = self.count_queries(Node.objects.all(), chunk_size=100)
+        self.make_trees(make_user('other@example.com'), 8)
+        many = self.count_queries(Node.objects.all(), chunk_size=100)
+        assert few[0] == 4 and many[0] == 20
+        assert few[1] == many[1]
+        # Twice the chunks, twice the queries (besides the cursor's)
+        halves = self.count_queries(Node.objects.all(), chunk_size=10)
+        assert halves[0] == 20
+        assert halves[1] > many[1]
+
+    def test_documents_match_website_search(self):
+        from osf_models.models import Node
+        from osf_models.utils.search_documents import node_documents
+        from website.search import search
+        user = make_user()
+        self.make_trees(user, 2)
+        queryset = Node.objects.order_by('pk')
+        for node, document in zip(queryset, node_documents(queryset)):
+            assert document == search.update_node(node, bulk=True, async=False)
+
+
+class NodeLogParamsTests(SimpleTestCase):
+    def test_split_and_merge_round_trip(self):
+        from osf_models.models.nodelog import merge_params, split_params
+        params = {
+            'node': 'abcde',
+            'project': None,
+            'parent_node': {'id': 'fghij'},
+            'contributors': ['klmno', 'pqrst'],
+            'tag': 'foo',
+        }
+        promoted, rest = split_params(params)
+        assert promoted == {
+            'node': 'abcde', 'project': None, 'parent_node': None, 'contributors': ['klmno', 'pqrst'],
+        }
+        # Values that don't fit the columns stay in the JSON
+        assert rest == {'project': None, 'parent_node': {'id': 'fghij'}, 'tag': 'foo'}
+        assert merge_params(promoted, rest) == params
+
+    def test_non_string_contributors_stay_in_the_json(self):
+        from osf_models.models.nodelog import split_params
+        promoted, rest = split_params({'contributors': ['abcde', {'id': 'fghij'}]})
+        assert promoted['contributors'] is None
+        assert rest == {'contributors': ['abcde', {'id': 'fghij'}]}
+
+    def test_constructor_params_are_split(self):
+        from osf_models.models import NodeLog
+        log = NodeLog(action=NodeLog.TAG_ADDED, params={'node': 'abcde', 'tag': 'foo'})
+        assert log.params_node == 'abcde'
+        assert log._params == {'tag': 'foo'}
+        assert log.params == {'node': 'abcde', 'tag': 'foo'}
+
+
+class NodeLogParamsSaveTests(TestCase):
+    def test_params_changed_in_place_are_saved(self):
+        from osf_models.models import NodeLog
+        user = make_user()
+        project = make_project(user)
+        log = NodeLog(
+            action=NodeLog.TAG_ADDED, params={'node': project._id, 'tag': 'foo'}, node=project, user=user
+        )
+        log.save()
+        log.params['project'] = project._id
+        log.params['tag'] = 'bar'
+        del log.params['node']
+        log.save()
+
+        log = NodeLog.objects.get(pk=log.pk)
+        assert (log.params_node, log.params_project) == (None, project._id)
+        assert log._params == {'tag': 'bar'}
+        assert log.params == {'project': project._id, 'tag': 'bar'}
+
+
+class BulkCreateWithGuidsTests(TestCase):
+    def test_guids_point_at_the_objects(self):
+        from osf_models.models import AlternativeCitation, Guid
+        citations = AlternativeCitation.bulk_create_with_guids(
+            [AlternativeCitation(name='Citation {}'.format(i), text='Text') for i in range(3)], batch_size=2
+        )
+        assert len({citation.guid_id for citation in citations}) == 3
+        for citation in citations:
+            guid = Guid.objects.get(pk=citation.guid_id)
+            assert guid.referent == citation
+            assert AlternativeCitation.load(citation._id) == citation
+
+
+class RegisterNodeTests(TestCase):
+    def test_registers_the_tree_without_deleted_children(self):
+        from osf_models.models import MetaSchema, Registration
+        from osf_models.utils.auth import Auth
+        user = make_user()
+        project = make_project(user)
+        project.add_tag('foo', auth=Auth(user), log=False)
+        component = make_project(user, title='Component', parent_node=project)
+        make_project(user, title='Deleted', parent_node=project, is_deleted=True)
+        schema = MetaSchema.objects.create(name='Schema', schema_version=1)
+
+        registration = project.register_node(schema, Auth(user), {'answer': 42})
+        children = list(registration.get_descendants_recursive())
+        assert [child.registered_from for child in children] == [component]
+        for registered, original in [(registration, project), (children[0], component)]:
+            assert isinstance(registered, Registration)
+            assert registered.registered_from == original
+            assert registered.registered_user == user
+            assert registered.registered_meta == {schema._id: {'answer': 42}}
+            assert not registered.is_public
+            assert list(registered.registered_schema.all()) == [schema]
+            assert set(registered.contributors.all()) == set(original.contributors.all())
+        assert children[0].ancestor_ids == [registration.pk]
+        assert children[0].root_id == registration.pk
+        assert [tag.name for tag in registration.tags.all()] == ['foo']
+        assert registration.logs.count() == project.logs.count()
+
+
+class GuidNoneReferentTests(TestCase):
+    def test_none_referents_match_nothing(self):
+        from osf_models.models import Guid
+        from osf_models.modm_compat import Q
+        user = make_user()
+        assert Guid.find(Q('referent', 'eq', None)).count() == 0
+        assert list(Guid.find(Q('referent', 'in', [user, None]))) == [user.guid]
+        assert Guid.load_referents([user.guid, None]) == [user, None]
@@ -0,0 +1,190 @@
+"""In-process pools of pre-checked, unused guids.
+
+A pool claims blocks of candidate guids from a permutation of the guid keyspace
+that is keyed with a secret (``SECRET_KEY`` by default), so that issued guids
+don't reveal which guids come next. Like the guids made by
+``generate_random_guid``, candidates never repeat a character. Blocks are
+numbered by a Postgres sequence, so blocks claimed by different processes never
+overlap. Sequences are not transactional, so a rolled-back transaction can
+never cause a block to be handed out twice. Each block is checked against the
+Guid and BlackListGuid tables in a single query, and the unused candidates are
+then handed out from memory.
+"""
+import hashlib
+import hmac
+import logging
+import os
+import struct
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+
+# Rounds of the Feistel network that permutes the keyspace
+FEISTEL_ROUNDS = 4
+
+# Refills in a row that may find no unused guid before ``take`` gives up
+MAX_EMPTY_REFILLS = 10
+
+
+class GuidPoolExhausted(Exception):
+    """Raised when a pool can't find unused guids."""
+    pass
+
+CLAIM_UNUSED_GUIDS_SQL = """
+SELECT candidate FROM unnest(%s::varchar[]) AS candidate
+WHERE NOT EXISTS (SELECT 1 FROM {guid_table} WHERE {guid_table}.guid = candidate)
+AND NOT EXISTS (SELECT 1 FROM {blacklist_table} WHERE {blacklist_table}.guid = candidate)
+"""
+
+
+class GuidPool(object):
+    """Hands out unused guids of a single length.
+
+    :param int length: Length of the guids in this pool
+    :param str alphabet: Characters that guids are made of
+    :param int batch_size: Number of candidates claimed per refill
+    :param str secret: Key of the permutation. Defaults to ``settings.SECRET_KEY``.
+    """
+
+    def __init__(self, length, alphabet, batch_size=DEFAULT_BATCH_SIZE, secret=None):
+        self.length = length
+        self.alphabet = alphabet
+        self.batch_size = batch_size
+        self.sequence_name = 'osf_models_guid_block_seq_{}'.format(length)
+        # Number of guids without repeated characters
+        self.keyspace_size = 1
+        for i in range(length):
+            self.keyspace_size *= len(alphabet) - i
+        # The Feistel network permutes the numbers of (at least) as many bits, in two halves
+        self._half_bits = (max(self.keyspace_size - 1, 1).bit_length() + 1) // 2
+        self._secret = secret
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Discard the pooled guids and the collected metrics."""
+        self._pid = os.getpid()
+        self._guids = []
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.discarded = 0
+        self.refill_seconds = 0.0
+        self.last_refill_seconds = None
+
+    @property
+    def hit_rate(self):
+        taken = self.hits + self.misses
+        return float(self.hits) / taken if taken else None
+
+    @property
+    def mean_refill_seconds(self):
+        return self.refill_seconds / self.refills if self.refills else None
+
+    def stats(self):
+        return {
+            'length': self.length,
+            'available': len(self._guids),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'refills': self.refills,
+            'discarded': self.discarded,
+            'refill_seconds': self.refill_seconds,
+            'last_refill_seconds': self.last_refill_seconds,
+            'mean_refill_seconds': self.mean_refill_seconds,
+        }
+
+    def take(self):
+        """Return an unused guid, claiming a new block if the pool is empty.
+
+        :raises GuidPoolExhausted: if the keyspace has been used up, or if
+            ``MAX_EMPTY_REFILLS`` blocks in a row were all used
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # A forked worker must not hand out the guids its parent holds
+                self.reset()
+            if self._guids:
+                self.hits += 1
+            else:
+                self.misses += 1
+                for _ in range(MAX_EMPTY_REFILLS):
+                    self.refill()
+                    if self._guids:
+                        break
+                else:
+                    raise GuidPoolExhausted(
+                        'No unused guids of length {} in {} blocks'.format(self.length, MAX_EMPTY_REFILLS)
+                    )
+            return self._guids.pop()
+
+    def refill(self):
+        start = time.time()
+        candidates = self._claim_block()
+        unused = self._exclude_used(candidates)
+        elapsed = time.time() - start
+
+        self.refills += 1
+        self.discarded += len(candidates) - len(unused)
+        self.refill_seconds += elapsed
+        self.last_refill_seconds = elapsed
+        self._guids.extend(unused)
+        logger.debug('Claimed {} of {} guids of length {} in {} seconds'.format(
+            len(unused), len(candidates), self.length, elapsed))
+
+    def _claim_block(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [self.sequence_name])
+            block = cursor.fetchone()[0]
+        start = block * self.batch_size
+        if start >= self.keyspace_size:
+            raise GuidPoolExhausted('Every guid of length {} has been claimed'.format(self.length))
+        return [self._nth_guid(n) for n in range(start, min(start + self.batch_size, self.keyspace_size))]
+
+    def _exclude_used(self, candidates):
+        Guid = apps.get_model('osf_models.Guid')
+        BlackListGuid = apps.get_model('osf_models.BlackListGuid')
+        sql = CLAIM_UNUSED_GUIDS_SQL.format(
+            guid_table=Guid._meta.db_table,
+            blacklist_table=BlackListGuid._meta.db_table,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [candidates])
+            return [row[0] for row in cursor.fetchall()]
+
+    def _nth_guid(self, n):
+        """The guid at position ``n`` of the keyed permutation of the keyspace."""
+        value = self._permute(n)
+        remaining = list(self.alphabet)
+        chars = []
+        for _ in range(self.length):
+            value, index = divmod(value, len(remaining))
+            chars.append(remaining.pop(index))
+        return ''.join(chars)
+
+    def _permute(self, n):
+        # The network permutes a domain that may be larger than the keyspace; walking
+        # the cycle until it lands back in the keyspace keeps it a permutation of the keyspace
+        value = self._feistel(n)
+        while value >= self.keyspace_size:
+            value = self._feistel(value)
+        return value
+
+    def _feistel(self, value):
+        mask = (1 << self._half_bits) - 1
+        left, right = value >> self._half_bits, value & mask
+        key = self._secret if self._secret is not None else settings.SECRET_KEY
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        for round_number in range(FEISTEL_ROUNDS):
+            digest = hmac.new(key, struct.pack('>BQ', round_number, right), hashlib.sha256).digest()
+            left, right = right, left ^ (int(digest[:8].encode('hex'), 16) & mask)
+        return (left << self._half_bits) | right
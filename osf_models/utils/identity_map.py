@@ -0,0 +1,138 @@
+"""Opt-in identity map for ``BaseModel.load`` and ``BaseModel.find_one``.
+
+While an identity map is active, loading the same row twice returns the
+instance that was already materialized instead of querying again. The map
+is thread-local and is only active inside ``identity_map()``:
+
+    with identity_map():
+        node = Node.load('abc12')
+        assert Node.load('abc12') is node
+
+``identity_map`` also works as a decorator (e.g. for Celery tasks and
+management commands), and ``IdentityMapMiddleware`` scopes a map to each
+request. Saving or deleting an instance through the ORM invalidates stale
+entries. Queryset ``update()`` bypasses the map, so avoid mixing the two
+within one scope.
+"""
+import functools
+import threading
+
+_local = threading.local()
+
+
+def get_identity_map():
+    """Return the active IdentityMap, or None if there is none."""
+    return getattr(_local, 'identity_map', None)
+
+
+class IdentityMap(object):
+
+    def __init__(self):
+        # (concrete model, pk) -> instance
+        self._objects = {}
+        # (concrete model, identifier passed to load) -> pk
+        self._aliases = {}
+
+    @staticmethod
+    def _model(obj_or_cls):
+        return obj_or_cls._meta.concrete_model
+
+    def get(self, model_cls, identifier):
+        """Return the instance loaded for ``identifier``, or None."""
+        model = self._model(model_cls)
+        pk = self._aliases.get((model, identifier))
+        obj = self._objects.get((model, pk))
+        # Proxy models (e.g. Registration and Node) share a concrete model
+        if obj is not None and isinstance(obj, model_cls):
+            return obj
+        return None
+
+    def add(self, obj, identifier=None):
+        """Register ``obj`` (optionally under the identifier it was loaded by) and
+        return the canonical instance for its row.
+        """
+        model = self._model(obj)
+        obj = self._objects.setdefault((model, obj.pk), obj)
+        if identifier is not None:
+            self._aliases[(model, identifier)] = obj.pk
+        return obj
+
+    def canonical(self, obj):
+        """Return the already-materialized instance for ``obj``'s row if there is one
+        of a compatible type, otherwise register ``obj``.
+        """
+        existing = self._objects.get((self._model(obj), obj.pk))
+        if existing is not None and isinstance(existing, obj.__class__):
+            return existing
+        return self.add(obj)
+
+    def saved(self, obj):
+        """Drop a stale instance of ``obj``'s row after ``obj`` was saved."""
+        key = (self._model(obj), obj.pk)
+        if self._objects.get(key, obj) is not obj:
+            del self._objects[key]
+
+    def discard(self, obj):
+        self._objects.pop((self._model(obj), obj.pk), None)
+
+    def discard_model(self, model_cls):
+        model = self._model(model_cls)
+        for key in [each for each in self._objects if each[0] is model]:
+            del self._objects[key]
+
+    def clear(self):
+        self._objects.clear()
+        self._aliases.clear()
+
+
+class identity_map(object):
+    """Context manager and decorator that activates an identity map for the
+    current thread. Nested scopes share the outermost map.
+    """
+
+    def __enter__(self):
+        self._owner = get_identity_map() is None
+        if self._owner:
+            _local.identity_map = IdentityMap()
+        return get_identity_map()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._owner:
+            _local.identity_map = None
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapped(*args, **kwargs):
+            with identity_map():
+                return func(*args, **kwargs)
+        return wrapped
+
+
+def identity_mapped(load):
+    """Decorate a ``load`` classmethod so that it consults the active identity map."""
+    @functools.wraps(load)
+    def wrapped(cls, data):
+        mapped = get_identity_map()
+        if mapped is None:
+            return load(cls, data)
+        obj = mapped.get(cls, data)
+        if obj is None:
+            obj = load(cls, data)
+            if obj is not None:
+                obj = mapped.add(obj, data)
+        return obj
+    return wrapped
+
+
+class IdentityMapMiddleware(object):
+    """Django middleware that scopes an identity map to each request."""
+
+    def process_request(self, request):
+        request._identity_map = identity_map()
+        request._identity_map.__enter__()
+
+    def process_response(self, request, response):
+        scope = getattr(request, '_identity_map', None)
+        if scope is not None:
+            scope.__exit__(None, None, None)
+        return response
@@ -0,0 +1,306 @@
+"""Query instrumentation for the modular-odm compatible entry points.
+
+Records, per call site, how many queries a ``load``, ``find``, ``find_one``,
+``remove``, ``sort`` or ``limit`` call caused, the time spent in the database
+and the number of rows returned. ``find``, ``sort`` and ``limit`` return lazy
+querysets, so their queries are recorded when the queryset is evaluated.
+
+Instrumentation is off until a sink is configured:
+
+    from osf_models.utils.instrumentation import instrumentation, LoggingSink
+    instrumentation.configure(sinks=[LoggingSink()], sample_rate=0.1, slow_query_seconds=0.5)
+
+or with the ``OSF_MODELS_INSTRUMENTATION`` setting, which holds the keyword
+arguments to ``configure``. Queries are only counted on connections that use
+the ``osf_models.db.backends.postgresql`` backend. Queries slower than
+``slow_query_seconds`` are reported to the sinks along with their ``EXPLAIN``
+output.
+"""
+import functools
+import logging
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def _source_path(module_file):
+    path = os.path.abspath(module_file)
+    return path[:-1] if path.endswith(('.pyc', '.pyo')) else path
+
+_OSF_MODELS_DIR = os.path.dirname(os.path.dirname(_source_path(__file__)))
+
+# Frames in these files (the compat layer itself) are skipped when looking for the call site
+_INTERNAL_FILES = frozenset([
+    _source_path(__file__),
+    os.path.join(_OSF_MODELS_DIR, 'modm_compat.py'),
+    os.path.join(_OSF_MODELS_DIR, 'models', 'base.py'),
+    os.path.join(_OSF_MODELS_DIR, 'utils', 'identity_map.py'),
+])
+_INTERNAL_DIRS = tuple(
+    os.path.dirname(_source_path(__import__(package).__file__)) + os.sep
+    for package in ('django', 'typedmodels')
+)
+
+
+def get_call_site():
+    """Return 'path:line in function' for the first frame outside of the compat layer and Django."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        path = os.path.abspath(frame.f_code.co_filename)
+        if path not in _INTERNAL_FILES and not path.startswith(_INTERNAL_DIRS):
+            return '{}:{} in {}'.format(frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name)
+        frame = frame.f_back
+    return None
+
+
+class CallStats(object):
+    """What one sampled call to a compat entry point cost."""
+
+    def __init__(self, model, entry_point, call_site):
+        self.model = model
+        self.entry_point = entry_point
+        self.call_site = call_site
+        self.queries = 0
+        self.rows = 0
+        self.db_seconds = 0.0
+        self.seconds = None
+
+    def __repr__(self):
+        return '<CallStats({}.{} at {}: {} queries, {} rows, {:.4f}s in db)>'.format(
+            self.model, self.entry_point, self.call_site, self.queries, self.rows, self.db_seconds)
+
+
+class SlowQuery(object):
+
+    def __init__(self, call, sql, params, seconds, plan):
+        self.call = call
+        self.sql = sql
+        self.params = params
+        self.seconds = seconds
+        self.plan = plan
+
+    def __repr__(self):
+        return '<SlowQuery({:.4f}s from {}.{} at {})>'.format(
+            self.seconds, self.call.model, self.call.entry_point, self.call.call_site)
+
+
+class LoggingSink(object):
+
+    def __init__(self, logger=logger, level=logging.INFO):
+        self.logger = logger
+        self.level = level
+
+    def record_call(self, call, sample_rate):
+        self.logger.log(
+            self.level, '%s.%s at %s: %s queries, %s rows, %.4fs in db, %.4fs total',
+            call.model, call.entry_point, call.call_site,
+            call.queries, call.rows, call.db_seconds, call.seconds
+        )
+
+    def record_slow_query(self, slow_query, sample_rate):
+        self.logger.warning(
+            'Slow query (%.4fs) from %s.%s at %s: %s\n%s',
+            slow_query.seconds, slow_query.call.model, slow_query.call.entry_point, slow_query.call.call_site,
+            slow_query.sql, slow_query.plan
+        )
+
+
+class StatsdSink(object):
+    """Sends counters and timers to a StatsD compatible daemon over UDP. Metrics are
+    named ``<prefix>.<model>.<entry point>.<metric>``.
+    """
+
+    def __init__(self, host='localhost', port=8125, prefix='osf_models'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _send(self, metrics, sample_rate):
+        rate = '|@{}'.format(sample_rate) if sample_rate < 1 else ''
+        packet = '\n'.join('{}.{}{}'.format(self.prefix, metric, rate) for metric in metrics)
+        try:
+            self.socket.sendto(packet.encode('utf-8'), self.address)
+        except socket.error:
+            # Metrics are best effort
+            logger.debug('Could not send metrics to %s:%s', *self.address)
+
+    def record_call(self, call, sample_rate):
+        name = '{}.{}'.format(call.model, call.entry_point)
+        self._send([
+            '{}.calls:1|c'.format(name),
+            '{}.queries:{}|c'.format(name, call.queries),
+            '{}.rows:{}|c'.format(name, call.rows),
+            '{}.db_time:{:.3f}|ms'.format(name, call.db_seconds * 1000),
+        ], sample_rate)
+
+    def record_slow_query(self, slow_query, sample_rate):
+        call = slow_query.call
+        self._send(['{}.{}.slow_queries:1|c'.format(call.model, call.entry_point)], sample_rate)
+
+
+class MemorySink(object):
+    """Keeps everything it receives, for tests."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.calls = []
+        self.slow_queries = []
+
+    def record_call(self, call, sample_rate):
+        self.calls.append(call)
+
+    def record_slow_query(self, slow_query, sample_rate):
+        self.slow_queries.append(slow_query)
+
+
+class Instrumentation(object):
+
+    def __init__(self):
+        self.configure()
+
+    def configure(self, sinks=None, sample_rate=1.0, slow_query_seconds=None, explain_slow_queries=True):
+        """
+        :param list sinks: Objects with ``record_call`` and ``record_slow_query`` methods.
+            Instrumentation is disabled if there are none.
+        :param float sample_rate: Fraction of entry point calls to record
+        :param float slow_query_seconds: Queries that take at least this long are reported
+            as slow queries. None disables slow query reporting.
+        :param bool explain_slow_queries: Whether to capture ``EXPLAIN`` output for slow queries
+        """
+        self.sinks = list(sinks or [])
+        self.sample_rate = sample_rate
+        self.slow_query_seconds = slow_query_seconds
+        self.explain_slow_queries = explain_slow_queries
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    def sample(self, model_cls, entry_point):
+        """Return a ``CallStats`` for a sampled call, or None if the call isn't recorded."""
+        if not self.sinks or random.random() >= self.sample_rate:
+            return None
+        return CallStats(model_cls.__name__, entry_point, get_call_site())
+
+    def is_recording(self):
+        return bool(getattr(_local, 'calls', None))
+
+    def start(self, call):
+        if not hasattr(_local, 'calls'):
+            _local.calls = []
+        _local.calls.append(call)
+        call._start = time.time()
+
+    def finish(self, call):
+        call.seconds = time.time() - call._start
+        _local.calls.remove(call)
+        for sink in self.sinks:
+            sink.record_call(call, self.sample_rate)
+
+    def record_query(self, connection, sql, params, seconds, rows):
+        """Attribute a query to the innermost call being recorded. Called by the database backend."""
+        calls = getattr(_local, 'calls', None)
+        if not calls:
+            return
+        call = calls[-1]
+        call.queries += 1
+        call.db_seconds += seconds
+        if rows > 0:
+            call.rows += rows
+        if self.slow_query_seconds is not None and seconds >= self.slow_query_seconds:
+            plan = self.explain(connection, sql, params) if self.explain_slow_queries else None
+            slow_query = SlowQuery(call, sql, params, seconds, plan)
+            for sink in self.sinks:
+                sink.record_slow_query(slow_query, self.sample_rate)
+
+    def explain(self, connection, sql, params):
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return None
+        # Use the DB-API cursor so that EXPLAIN itself isn't instrumented
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute('EXPLAIN ' + sql, params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+        except Exception:
+            logger.exception('Could not EXPLAIN slow query')
+            return None
+        finally:
+            cursor.close()
+
+instrumentation = Instrumentation()
+
+
+def instrumented(entry_point):
+    """Decorate a compat classmethod (e.g. ``load``) so that sampled calls are recorded."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapped(cls, *args, **kwargs):
+            call = instrumentation.sample(cls, entry_point)
+            if call is None:
+                return func(cls, *args, **kwargs)
+            instrumentation.start(call)
+            try:
+                return func(cls, *args, **kwargs)
+            finally:
+                instrumentation.finish(call)
+        return wrapped
+    return decorator
+
+
+def instrumented_queryset(entry_point):
+    """Decorate a compat method that returns a queryset (e.g. ``find``), so that
+    sampled querysets record their queries when they are evaluated. Chained entry
+    points (e.g. ``find(...).sort(...)``) keep the sampling decision of the first one.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapped(self_or_cls, *args, **kwargs):
+            queryset = func(self_or_cls, *args, **kwargs)
+            if not instrumentation.sinks:
+                return queryset
+            source = getattr(self_or_cls, '_instrumented', None)
+            if source is False:
+                # The queryset this was derived from wasn't sampled
+                queryset._instrumented = False
+            elif source is None:
+                call = instrumentation.sample(queryset.model, entry_point)
+                queryset._instrumented = (entry_point, call.call_site) if call else False
+            else:
+                queryset._instrumented = ('{}.{}'.format(source[0], entry_point), get_call_site())
+            return queryset
+        return wrapped
+    return decorator
+
+
+def record_evaluation(method):
+    """Decorate a queryset method that runs queries, so that they are recorded
+    for querysets returned by a sampled compat entry point. Querysets evaluated
+    within another recorded call (e.g. by ``remove``) count towards that call.
+    """
+    @functools.wraps(method)
+    def wrapped(queryset, *args, **kwargs):
+        if (
+            not queryset._instrumented or
+            not instrumentation.sinks or
+            # Already evaluated; no queries to record
+            queryset._result_cache is not None or
+            instrumentation.is_recording()
+        ):
+            return method(queryset, *args, **kwargs)
+        entry_point, call_site = queryset._instrumented
+        call = CallStats(queryset.model.__name__, entry_point, call_site)
+        instrumentation.start(call)
+        try:
+            return method(queryset, *args, **kwargs)
+        finally:
+            instrumentation.finish(call)
+    return wrapped
@@ -0,0 +1,95 @@
+"""Helpers for keyset ("seek") pagination (see ``MODMCompatibilityQuerySet.seek``).
+
+Instead of skipping ``offset`` rows, each page is filtered to the rows that
+sort after the last row of the previous page, so page N costs the same as
+page 1 given an index on the sort keys. Cursors are opaque, URL-safe strings
+that hold the sort keys and the values of the last row.
+"""
+import base64
+import binascii
+import json
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Model, Q as DjangoQ
+from osf_models.utils.datetime_aware_jsonfield import DateTimeAwareJSONEncoder, decode_datetime_objects
+
+
+def keyset_keys(ordering, pk_name='pk'):
+    """Return the sort keys for keyset pagination over ``ordering`` (e.g. the keys
+    produced by ``sort()``), with the primary key appended as a tie-breaker.
+    """
+    keys = []
+    for key in ordering:
+        if not isinstance(key, basestring) or key == '?':
+            raise ValueError('Keyset pagination only supports ordering by field names, not {!r}'.format(key))
+        keys.append(key)
+    if not any(key.lstrip('-') in ('pk', pk_name) for key in keys):
+        keys.append('pk')
+    return keys
+
+
+def keyset_values(obj, keys):
+    """Return the values of ``keys`` on ``obj``. Foreign keys are read from their column
+    (e.g. ``node_id`` for ``node``), so the related rows aren't fetched.
+    """
+    values = []
+    for key in keys:
+        value = obj
+        attributes = key.lstrip('-').split('__')
+        for attribute in attributes[:-1]:
+            value = getattr(value, attribute)
+        value = getattr(value, _attname(value, attributes[-1]))
+        if isinstance(value, Model):
+            value = value.pk
+        values.append(value)
+    return values
+
+
+def _attname(obj, name):
+    try:
+        field = obj._meta.get_field(name)
+    except (AttributeError, FieldDoesNotExist):
+        return name
+    return getattr(field, 'attname', name)
+
+
+def keyset_filter(keys, values):
+    """Return a Django query for the rows that sort after ``values``.
+
+    Rows sort after the cursor if they are past it on the first key, or tied on
+    the first key and past it on the second, and so on. Descending keys
+    (prefixed with '-') compare with ``lt``. Sort keys must not be null.
+    """
+    clauses = []
+    for index, (key, value) in enumerate(zip(keys, values)):
+        operator = 'lt' if key.startswith('-') else 'gt'
+        clause = DjangoQ(**{'{}__{}'.format(key.lstrip('-'), operator): value})
+        for tied_key, tied_value in zip(keys[:index], values[:index]):
+            clause &= DjangoQ(**{tied_key.lstrip('-'): tied_value})
+        clauses.append(clause)
+    return reduce(or_, clauses)
+
+
+def encode_cursor(keys, values):
+    payload = {
+        'keys': keys,
+        'values': {str(index): value for index, value in enumerate(values)},
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, cls=DateTimeAwareJSONEncoder))
+
+
+def decode_cursor(cursor, keys):
+    """Return the values held by ``cursor``.
+
+    :raises ValueError: if the cursor is malformed or was made for different sort keys
+    """
+    try:
+        payload = decode_datetime_objects(json.loads(base64.urlsafe_b64decode(str(cursor))))
+        cursor_keys = payload['keys']
+        values = [payload['values'][str(index)] for index in range(len(cursor_keys))]
+    except (TypeError, ValueError, KeyError, binascii.Error):
+        raise ValueError('Invalid cursor: {!r}'.format(cursor))
+    if cursor_keys != keys:
+        raise ValueError('Cursor was made for the sort keys {}, not {}'.format(cursor_keys, keys))
+    return values
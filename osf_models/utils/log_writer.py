@@ -0,0 +1,116 @@
+"""Buffered writes of NodeLogs (see ``Loggable.add_log``).
+
+By default each log is inserted as soon as it is added. In buffered mode, logs
+added inside a transaction are queued in memory and inserted with one multi-row
+insert when the outermost transaction commits, in order of their ``date``. The
+activity counters of their users are updated after the insert, by default one
+log at a time as without buffering (see ``configure``). Logs added outside of a
+transaction are still written right away. Turn it on with:
+
+    from osf_models.utils.log_writer import log_writer
+    log_writer.configure(buffered=True)
+
+or with the ``OSF_MODELS_LOG_WRITER`` setting, which holds the keyword arguments
+to ``configure``. Leave it off in tests: ``TestCase`` never commits, so queued
+logs would never be written.
+
+Queued logs aren't in the database (e.g. in ``node.logs``) until the
+transaction commits. They are discarded if it is rolled back. Logs queued in a
+savepoint that is rolled back are only discarded on connections that use the
+``osf_models.db.backends.postgresql`` backend.
+"""
+import threading
+
+from django.apps import apps
+from django.db import connection
+
+_local = threading.local()
+
+
+def increment_counters(logs):
+    """Update the activity counters of the users of ``logs``, one log at a time, with
+    ``framework.analytics.increment_user_activity_counters``. The framework has no
+    batched update of the counters.
+    """
+    from framework.analytics import increment_user_activity_counters
+
+    for log in logs:
+        if log.user:
+            increment_user_activity_counters(log.user._primary_key, log.action, log.date.isoformat())
+
+
+class LogBuffer(object):
+    """The logs queued in one transaction."""
+
+    def __init__(self):
+        # (ids of the savepoints that were active, logs)
+        self.batches = []
+
+    @property
+    def logs(self):
+        return [log for _, logs in self.batches for log in logs]
+
+
+class LogWriter(object):
+
+    def __init__(self):
+        self.configure()
+
+    def configure(self, buffered=False, increment_activity=None):
+        """
+        :param bool buffered: Whether to queue logs until their transaction commits
+        :param increment_activity: Called with the logs queued in a transaction once they
+            are written, to update the activity counters of their users. Only used in
+            buffered mode, where it may update the counters in bulk. Defaults to
+            ``increment_counters``.
+        """
+        self.buffered = buffered
+        self.increment_activity = increment_activity or increment_counters
+
+    def write(self, logs):
+        """Write unsaved ``logs`` now, or queue them until the transaction commits."""
+        logs = list(logs)
+        if not logs:
+            return logs
+        if not self.buffered or not connection.in_atomic_block:
+            self.flush(logs, increment_counters)
+        else:
+            self._get_buffer().batches.append((set(connection.savepoint_ids), logs))
+        return logs
+
+    def _get_buffer(self):
+        buffer = getattr(_local, 'buffer', None)
+        # If the transaction that the buffer was made for was rolled back, its
+        # on_commit callback was dropped, and so are its logs
+        pending = (getattr(func, 'buffer', None) for _, func in connection.run_on_commit)
+        if buffer is None or buffer not in pending:
+            buffer = _local.buffer = LogBuffer()
+
+            def flush_buffer():
+                if getattr(_local, 'buffer', None) is buffer:
+                    _local.buffer = None
+                self.flush(buffer.logs, self.increment_activity)
+            flush_buffer.buffer = buffer
+            # Unlike transaction.on_commit, register the callback with the outermost
+            # atomic block rather than the current savepoint, so that rolling back the
+            # savepoint doesn't drop the logs queued after it
+            connection.run_on_commit.append((set(), flush_buffer))
+        return buffer
+
+    def savepoint_rolled_back(self, sid):
+        """Discard the logs queued within the savepoint ``sid``. Called by the database backend."""
+        buffer = getattr(_local, 'buffer', None)
+        if buffer is not None:
+            buffer.batches = [(sids, logs) for sids, logs in buffer.batches if sid not in sids]
+
+    def flush(self, logs, increment_activity):
+        """Insert ``logs`` with one statement, oldest first, then update the activity counters
+        of their users with ``increment_activity``.
+        """
+        NodeLog = apps.get_model('osf_models.NodeLog')
+        logs = sorted(logs, key=lambda log: log.date)
+        NodeLog.insert_with_guids(logs)
+        increment_activity(logs)
+        return logs
+
+log_writer = LogWriter()
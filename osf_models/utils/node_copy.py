@@ -0,0 +1,228 @@
+"""Set-based copies of trees of nodes (see ``AbstractNode.fork_node`` and
+``AbstractNode.register_node``).
+
+Copying a tree node by node costs several queries per node, and more per tag,
+citation and log. These helpers copy a whole tree with a fixed number of
+statements per model: the copies are bulk inserted along with their Guids, one
+UPDATE links them into a tree, and their many-to-many links are copied with
+``INSERT ... SELECT``. Like ``bulk_create``, they bypass ``save``, so callers
+are responsible for sending signals.
+"""
+from collections import OrderedDict, defaultdict
+
+from django.apps import apps
+from django.db import connection, models
+
+# Links copies into a tree: sets the parent, ancestry and root of each copy
+LINK_COPIES_SQL = """
+UPDATE {table} AS node SET
+    parent_node_id = tree.parent_node_id,
+    ancestor_ids = tree.ancestor_ids,
+    root_id = tree.root_id
+FROM (VALUES {values}) AS tree(id, parent_node_id, ancestor_ids, root_id)
+WHERE node.id = tree.id
+"""
+LINK_COPIES_VALUES = '(%s, %s::integer, %s::integer[], %s)'
+
+# Gives each copy the many-to-many links of its original
+COPY_LINKS_SQL = """
+INSERT INTO {table} ({node_column}, {target_column})
+SELECT copy.id, link.{target_column} FROM {table} AS link
+JOIN unnest(%s::integer[], %s::integer[]) AS copy(original_id, id) ON link.{node_column} = copy.original_id
+"""
+
+# Gives each copy a copy of the rows that point at its original (e.g. its contributors)
+COPY_RELATED_ROWS_SQL = """
+INSERT INTO {table} ({columns})
+SELECT {values} FROM {table} AS original
+JOIN unnest(%s::integer[], %s::integer[]) AS copy(original_id, id)
+    ON original.{node_column} = copy.original_id
+"""
+
+
+class NodeTree(object):
+    """A node and its descendants."""
+
+    def __init__(self, root, descendants):
+        self.root = root
+        self.nodes = [root] + list(descendants)
+        self._children = defaultdict(list)
+        for node in descendants:
+            self._children[node.parent_node_id].append(node)
+        for siblings in self._children.values():
+            siblings.sort(key=lambda node: (node._order, node.pk))
+
+    @classmethod
+    def fetch(cls, node):
+        """Fetch ``node`` anew along with its descendants, in one query."""
+        AbstractNode = apps.get_model('osf_models.AbstractNode')
+        nodes = AbstractNode.objects.filter(
+            models.Q(pk=node.pk) | models.Q(ancestor_ids__contains=[node.pk])
+        ).select_related('node_license')
+        descendants = []
+        root = None
+        for each in nodes:
+            if each.pk == node.pk:
+                root = each
+            else:
+                descendants.append(each)
+        if root is None:
+            raise AbstractNode.DoesNotExist('{!r} does not exist'.format(node))
+        return cls(root, descendants)
+
+    def walk(self, include=lambda node: True):
+        """Yield the root and then its descendants depth-first, in child order. Descendants
+        for which ``include`` returns False are skipped along with their own descendants.
+        """
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed([child for child in self._children[node.pk] if include(child)]))
+
+
+def copy_nodes(originals, prepare=None, copy_class=None, parent=None):
+    """Insert a copy of each of ``originals``, which must be a tree as yielded by
+    ``NodeTree.walk``. Copies keep the field values of their originals, except:
+
+    * each copy gets a new Guid and a copy of its original's license (which may be
+      inherited from an ancestor, see ``AbstractNode.license``)
+    * the copies of children are children of the copy of their parent. The copy of
+      the first node is a child of ``parent`` if given, or else of the first node's parent.
+
+    Many-to-many fields aren't copied (see ``copy_links``).
+
+    :param list originals: Nodes, parents before children
+    :param prepare: Called with each copy and its original before the copies are inserted
+    :param copy_class: Called with each original to get the model of its copy. By default,
+        copies have the model of their original.
+    :param parent: Parent node of the copy of the first node
+    :return: OrderedDict mapping the pk of each original to its copy
+    """
+    NodeLicenseRecord = apps.get_model('osf_models.NodeLicenseRecord')
+    AbstractNode = apps.get_model('osf_models.AbstractNode')
+    if not originals:
+        return OrderedDict()
+    first = originals[0]
+
+    licenses = {}
+    for original in originals:
+        inherited = first.license if original is first else licenses[original.parent_node_id]
+        licenses[original.pk] = original.node_license or inherited
+    license_copies = {
+        pk: NodeLicenseRecord(
+            node_license_id=record.node_license_id,
+            year=record.year,
+            copyright_holders=record.copyright_holders,
+        )
+        for pk, record in licenses.items() if record is not None
+    }
+    NodeLicenseRecord.bulk_create_with_guids(license_copies.values())
+
+    copies = OrderedDict()
+    by_class = defaultdict(list)
+    for original in originals:
+        cls = copy_class(original) if copy_class else original.__class__
+        copy = cls(**{
+            field.attname: getattr(original, field.attname)
+            for field in cls._meta.concrete_fields
+            # The type is set by the class
+            if not field.primary_key and field.attname not in ('guid_id', 'type')
+        })
+        copy.node_license = license_copies.get(original.pk)
+        if prepare:
+            prepare(copy, original)
+        copies[original.pk] = copy
+        by_class[cls].append(copy)
+    for cls, objs in by_class.items():
+        cls.bulk_create_with_guids(objs)
+
+    params = []
+    for original in originals:
+        copy = copies[original.pk]
+        copy_parent = parent if original is first else copies[original.parent_node_id]
+        if copy_parent is not None:
+            copy.parent_node = copy_parent
+            copy.ancestor_ids = copy_parent.ancestor_ids + [copy_parent.pk]
+        copy.root_id = copy.ancestor_ids[0] if copy.ancestor_ids else copy.pk
+        params.extend([copy.pk, copy.parent_node_id, copy.ancestor_ids, copy.root_id])
+    with connection.cursor() as cursor:
+        cursor.execute(LINK_COPIES_SQL.format(
+            table=AbstractNode._meta.db_table,
+            values=', '.join([LINK_COPIES_VALUES] * len(copies)),
+        ), params)
+    return copies
+
+
+def copy_links(field_name, copies):
+    """Give each copy the links of its original for the many-to-many field ``field_name``
+    (e.g. 'tags'), with one ``INSERT ... SELECT``.
+
+    :param copies: Mapping of the pk of each original to its copy, as returned by ``copy_nodes``
+    :return: Number of links created
+    """
+    AbstractNode = apps.get_model('osf_models.AbstractNode')
+    field = AbstractNode._meta.get_field(field_name)
+    quote_name = connection.ops.quote_name
+    sql = COPY_LINKS_SQL.format(
+        table=quote_name(field.remote_field.through._meta.db_table),
+        node_column=quote_name(field.m2m_column_name()),
+        target_column=quote_name(field.m2m_reverse_name()),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [list(copies.keys()), [copy.pk for copy in copies.values()]])
+        return cursor.rowcount
+
+
+def copy_related_rows(model, field_name, copies):
+    """Give each copy a copy of each ``model`` row whose ``field_name`` foreign key points
+    at its original (e.g. ``Contributor``, 'node'), with one ``INSERT ... SELECT``.
+
+    :param copies: Mapping of the pk of each original to its copy, as returned by ``copy_nodes``
+    :return: Number of rows created
+    """
+    quote_name = connection.ops.quote_name
+    node_column = model._meta.get_field(field_name).column
+    columns = [field.column for field in model._meta.concrete_fields if not field.primary_key]
+    sql = COPY_RELATED_ROWS_SQL.format(
+        table=quote_name(model._meta.db_table),
+        columns=', '.join(quote_name(column) for column in columns),
+        values=', '.join(
+            'copy.id' if column == node_column else 'original.{}'.format(quote_name(column))
+            for column in columns
+        ),
+        node_column=quote_name(node_column),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [list(copies.keys()), [copy.pk for copy in copies.values()]])
+        return cursor.rowcount
+
+
+def copy_citations(copies):
+    """Give each copy its own copies of its original's alternative citations.
+
+    :param copies: Mapping of the pk of each original to its copy, as returned by ``copy_nodes``
+    :return: The new citations
+    """
+    AbstractNode = apps.get_model('osf_models.AbstractNode')
+    AlternativeCitation = apps.get_model('osf_models.AlternativeCitation')
+    field = AbstractNode._meta.get_field('alternative_citations')
+    through = field.remote_field.through
+    node_name, citation_name = field.m2m_field_name(), field.m2m_reverse_field_name()
+
+    links = through.objects.filter(
+        **{'{}__in'.format(node_name): list(copies.keys())}
+    ).select_related(citation_name).order_by('pk')
+    copied_links = []
+    for link in links:
+        citation = getattr(link, citation_name)
+        copied_links.append((
+            copies[getattr(link, field.m2m_column_name())],
+            AlternativeCitation(name=citation.name, text=citation.text),
+        ))
+    citations = AlternativeCitation.bulk_create_with_guids(copied for _, copied in copied_links)
+    through.objects.bulk_create([
+        through(**{node_name: copy, citation_name: copied})
+        for copy, copied in copied_links
+    ])
+    return citations
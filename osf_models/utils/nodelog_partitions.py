@@ -0,0 +1,153 @@
+"""Monthly partitions of the NodeLog table (see the nodelog_partitions command).
+
+New logs are always inserted into the NodeLog table itself, which holds the
+recent ("hot") logs. Rolling moves each month of logs older than ``HOT_MONTHS``
+into its own partition: a table that inherits from the NodeLog table, so that
+queries on NodeLog still see its rows, with a CHECK constraint on ``date`` so
+that queries filtered on ``date`` skip it (constraint exclusion). Archiving
+moves whole partitions into ``ARCHIVE_TABLE``, which has a single index and
+isn't seen by queries on NodeLog.
+
+Inheritance is used rather than declarative partitioning because inserts into
+a partitioned parent can't return the new row's id to Django.
+"""
+import re
+from datetime import datetime
+
+import pytz
+from django.apps import apps
+from django.db import connection
+
+# Months of logs (besides the current one) that stay in the NodeLog table when rolling
+HOT_MONTHS = 3
+
+ARCHIVE_TABLE = 'osf_models_nodelog_archive'
+
+PARTITION_NAME = '{table}_y{year:04d}m{month:02d}'
+PARTITION_NAME_RE = re.compile(r'_y(\d{4})m(\d{2})$')
+
+CREATE_PARTITION_SQL = """
+CREATE TABLE IF NOT EXISTS {partition} (
+    CHECK (date IS NOT NULL AND date >= %(start)s AND date < %(end)s)
+) INHERITS ({table});
+CREATE UNIQUE INDEX IF NOT EXISTS {partition}_guid_id ON {partition} (guid_id);
+CREATE INDEX IF NOT EXISTS {partition}_node_id_date ON {partition} (node_id, date);
+CREATE INDEX IF NOT EXISTS {partition}_user_id ON {partition} (user_id);
+"""
+
+MOVE_TO_PARTITION_SQL = """
+WITH moved AS (
+    DELETE FROM ONLY {table} WHERE date >= %(start)s AND date < %(end)s RETURNING *
+)
+INSERT INTO {partition} SELECT * FROM moved
+"""
+
+LIST_PARTITIONS_SQL = """
+SELECT child.relname FROM pg_inherits
+JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+WHERE pg_inherits.inhparent = %s::regclass
+"""
+
+UNROLLED_MONTHS_SQL = """
+SELECT DISTINCT date_trunc('month', date) FROM ONLY {table} WHERE date < %s
+"""
+
+
+def month_start(date, months_ago=0):
+    """The first instant (UTC) of the month ``months_ago`` months before the month of ``date``."""
+    index = date.year * 12 + date.month - 1 - months_ago
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=pytz.utc)
+
+
+def next_month(date):
+    return month_start(date, months_ago=-1)
+
+
+def hot_cutoff(now):
+    """Logs dated before this are moved out of the NodeLog table when rolling."""
+    return month_start(now, months_ago=HOT_MONTHS)
+
+
+def _table():
+    return apps.get_model('osf_models.NodeLog')._meta.db_table
+
+
+def partition_name(start):
+    return PARTITION_NAME.format(table=_table(), year=start.year, month=start.month)
+
+
+def list_partitions():
+    """Return (name, start of month) for each partition, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(LIST_PARTITIONS_SQL, [_table()])
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME_RE.search(name)
+        if match:
+            partitions.append((name, datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=pytz.utc)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition(start):
+    """Create the (empty) partition for the month that begins at ``start``, if it doesn't exist.
+
+    :return: The name of the partition
+    """
+    quote_name = connection.ops.quote_name
+    partition = partition_name(start)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            CREATE_PARTITION_SQL.format(table=quote_name(_table()), partition=quote_name(partition)),
+            {'start': start, 'end': next_month(start)}
+        )
+    return partition
+
+
+def roll(now):
+    """Move the logs in the NodeLog table dated before ``hot_cutoff(now)`` into monthly
+    partitions, creating partitions as needed.
+
+    :return: List of (partition name, number of logs moved)
+    """
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(UNROLLED_MONTHS_SQL.format(table=quote_name(_table())), [hot_cutoff(now)])
+        months = sorted(month_start(row[0]) for row in cursor.fetchall())
+    moved = []
+    for start in months:
+        partition = create_partition(start)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                MOVE_TO_PARTITION_SQL.format(table=quote_name(_table()), partition=quote_name(partition)),
+                {'start': start, 'end': next_month(start)}
+            )
+            moved.append((partition, cursor.rowcount))
+    return moved
+
+
+def archive(before):
+    """Move the partitions for months that end on or before ``before`` into the archive
+    table, and drop them.
+
+    :return: List of (partition name, number of logs archived)
+    """
+    quote_name = connection.ops.quote_name
+    archived = []
+    for partition, start in list_partitions():
+        if next_month(start) > before:
+            continue
+        with connection.cursor() as cursor:
+            # Only the columns that the archive table has (partitions may have columns that
+            # were added to NodeLog without being added to the archive table)
+            cursor.execute(
+                'SELECT column_name FROM information_schema.columns '
+                'WHERE table_schema = current_schema() AND table_name = %s', [ARCHIVE_TABLE]
+            )
+            columns = ', '.join(quote_name(row[0]) for row in cursor.fetchall())
+            cursor.execute('INSERT INTO {archive} ({columns}) SELECT {columns} FROM ONLY {partition}'.format(
+                archive=quote_name(ARCHIVE_TABLE), columns=columns, partition=quote_name(partition)
+            ))
+            archived.append((partition, cursor.rowcount))
+            cursor.execute('DROP TABLE {}'.format(quote_name(partition)))
+    return archived
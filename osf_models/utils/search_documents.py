@@ -0,0 +1,144 @@
+"""Search documents for many nodes at once, for reindexing.
+
+Serializing a node for the search index touches its contributors, tags,
+institutions, license, parent, sanctions and wiki pages, each with one or more
+queries. ``node_documents`` streams a queryset of nodes from a server side
+cursor and serializes them in chunks, with a fixed number of queries per chunk
+(contributors, tags, institutions, ancestors, registrations and wiki pages), so
+a full reindex needs a few queries per thousand nodes and only holds one chunk
+in memory:
+
+    for document in node_documents(AbstractNode.objects.filter(is_deleted=False)):
+        ...
+
+Documents have the fields of the documents built by ``website.search``.
+"""
+import itertools
+import unicodedata
+from collections import defaultdict
+
+from django.apps import apps
+
+
+def node_documents(queryset, chunk_size=1000):
+    """Yield a search document for each node in ``queryset``, in the queryset's order."""
+    nodes = iter(queryset.select_related('guid', 'node_license__node_license').stream(chunk_size=chunk_size))
+    while True:
+        chunk = list(itertools.islice(nodes, chunk_size))
+        if not chunk:
+            return
+        for document in serialize_nodes(chunk):
+            yield document
+
+
+def serialize_nodes(nodes):
+    """Return the search documents for ``nodes``, in order."""
+    AbstractNode = apps.get_model('osf_models.AbstractNode')
+    Contributor = apps.get_model('osf_models.Contributor')
+    NodeWikiPage = apps.get_model('osf_models.NodeWikiPage')
+    Registration = apps.get_model('osf_models.Registration')
+    node_ids = [node.pk for node in nodes]
+
+    contributors = defaultdict(list)
+    for contributor in Contributor.objects.filter(
+        node_id__in=node_ids, visible=True
+    ).select_related('user__guid').order_by('node_id', '_order'):
+        contributors[contributor.node_id].append(contributor.user)
+
+    tags = defaultdict(list)
+    for node_id, name in AbstractNode.tags.through.objects.filter(
+        abstractnode_id__in=node_ids, tag__system=False
+    ).order_by('pk').values_list('abstractnode_id', 'tag__name'):
+        tags[node_id].append(name)
+
+    institutions = defaultdict(list)
+    for node_id, name in AbstractNode.affiliated_institutions.through.objects.filter(
+        abstractnode_id__in=node_ids
+    ).order_by('pk').values_list('abstractnode_id', 'institution__name'):
+        institutions[node_id].append(name)
+
+    # Ancestors give the parent and inherited license of each node
+    ancestors = AbstractNode.objects.select_related('guid', 'node_license__node_license').in_bulk(
+        list({pk for node in nodes for pk in node.ancestor_ids})
+    )
+    # Registrations inherit sanctions from their ancestors, which are also registrations
+    registrations = Registration.objects.select_related(*Registration.SANCTION_FIELDS).in_bulk(
+        list({pk for node in nodes if node.is_registration for pk in [node.pk] + node.ancestor_ids})
+    )
+
+    for node in nodes:
+        node._prefetched_ancestors = ancestors
+        if node.parent_node_id in ancestors:
+            node.parent_node = ancestors[node.parent_node_id]
+        if node.is_registration:
+            node._prefetched_registrations = registrations
+
+    wiki_ids = {
+        wiki_id for node in nodes if not node.is_retracted
+        for wiki_id in (node.wiki_pages_current or {}).values()
+    }
+    wikis = NodeWikiPage.load_many(wiki_ids) if wiki_ids else {}
+
+    return [
+        serialize_node(node, contributors[node.pk], tags[node.pk], institutions[node.pk], wikis)
+        for node in nodes
+    ]
+
+
+def serialize_node(node, contributors, tags, institutions, wikis):
+    """The search document for ``node``, given its visible contributors, the names of its
+    tags and institutions, and the wiki pages of the chunk keyed by id.
+    """
+    if node.is_registration:
+        category = 'registration'
+    elif node.parent_node_id is None:
+        category = 'project'
+    else:
+        category = 'component'
+    title = node.title or u''
+    document = {
+        'id': node._id,
+        'contributors': [
+            {'fullname': user.fullname, 'url': user.profile_url if user.is_active else None}
+            for user in contributors
+        ],
+        'title': title,
+        'normalized_title': unicodedata.normalize('NFKD', unicode(title)).encode('ascii', 'ignore'),
+        'category': category,
+        'public': node.is_public,
+        'tags': tags,
+        'description': node.description,
+        'url': node.url,
+        'is_registration': node.is_registration,
+        'is_pending_registration': node.is_pending_registration,
+        'is_retracted': node.is_retracted,
+        'is_pending_retraction': node.is_pending_retraction,
+        'embargo_end_date': node.embargo_end_date,
+        'is_pending_embargo': node.is_pending_embargo,
+        'registered_date': getattr(node, 'registered_date', None),
+        'wikis': {},
+        'parent_id': node.parent_node._id if node.parent_node_id is not None else None,
+        'date_created': node.date_created,
+        'license': serialize_license(node.license),
+        'affiliated_institutions': institutions,
+        'boost': int(not node.is_registration) + 1,
+    }
+    if not document['is_retracted']:
+        for wiki_id in (node.wiki_pages_current or {}).values():
+            wiki = wikis.get(wiki_id)
+            if wiki is not None:
+                document['wikis'][wiki.page_name] = wiki.raw_text(node)
+    return document
+
+
+def serialize_license(record):
+    if record is None:
+        return None
+    node_license = record.node_license
+    return {
+        'id': node_license.license_id if node_license else None,
+        'name': node_license.name if node_license else None,
+        'text': node_license.text if node_license else None,
+        'year': record.year,
+        'copyright_holders': record.copyright_holders,
+    }
@@ -0,0 +1,186 @@
+"""Coalesced search index updates (see ``AbstractNode.update_search`` and
+``OSFUser.update_search``).
+
+By default each update is sent to the search backend as soon as it is
+requested. One request often asks for the same node to be reindexed many times
+(e.g. once per save, and again for each node of a tree when a registration is
+approved). When coalescing is on, updates requested inside a transaction are
+queued, deduplicated by node and user, and sent when the transaction commits
+(``transaction.on_commit``), using the last instance of each that was queued.
+The nodes are sent as one bulk update. Each user is updated once, with its own
+update, because ``website.search`` has no bulk update for users. Updates
+requested outside of a transaction are still sent right away. Turn it on with:
+
+    from osf_models.utils.search_updater import search_updater
+    search_updater.configure(coalesce=True)
+
+or with the ``OSF_MODELS_SEARCH_UPDATER`` setting, which holds the keyword
+arguments to ``configure``. ``TestCase`` never commits, so tests that coalesce
+should use a ``MemorySearchBackend`` and call ``flush`` themselves.
+
+Queued updates are discarded if the transaction is rolled back. Updates queued
+in a savepoint that is rolled back are still sent, because they are flushed
+when the outermost transaction commits; reindexing a node that didn't change
+is harmless.
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class WebsiteSearchBackend(object):
+    """Sends updates to ``website.search``: nodes in bulk, users one at a time."""
+
+    def update_nodes(self, nodes):
+        from framework.sentry import log_exception
+        from website import search
+
+        try:
+            if len(nodes) == 1:
+                search.search.update_node(nodes[0], bulk=False, async=True)
+            else:
+                search.search.bulk_update_nodes(
+                    lambda node: search.search.update_node(node, bulk=True, async=False), nodes
+                )
+        except search.exceptions.SearchUnavailableError as e:
+            logger.exception(e)
+            log_exception()
+
+    def update_users(self, users):
+        from framework.sentry import log_exception
+        from website.search.exceptions import SearchUnavailableError
+        from website.search.search import update_user
+
+        for user in users:
+            try:
+                update_user(user)
+            except SearchUnavailableError as e:
+                logger.exception(e)
+                log_exception()
+
+
+class MemorySearchBackend(object):
+    """Keeps every update it receives, for tests."""
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        # One list of nodes or users per update sent
+        self.node_updates = []
+        self.user_updates = []
+
+    def update_nodes(self, nodes):
+        self.node_updates.append(list(nodes))
+
+    def update_users(self, users):
+        self.user_updates.append(list(users))
+
+
+class SearchUpdateBuffer(object):
+    """The updates queued in one transaction."""
+
+    def __init__(self):
+        # pk -> last instance queued
+        self.nodes = OrderedDict()
+        self.users = OrderedDict()
+        self.requested = 0
+
+    def add(self, objs, obj):
+        objs.pop(obj.pk, None)
+        objs[obj.pk] = obj
+        self.requested += 1
+
+    def add_node(self, node):
+        self.add(self.nodes, node)
+
+    def add_user(self, user):
+        self.add(self.users, user)
+
+
+class SearchUpdater(object):
+
+    def __init__(self):
+        self.configure()
+
+    def configure(self, coalesce=False, backend=None):
+        """
+        :param bool coalesce: Whether to queue updates until their transaction commits
+        :param backend: Object with ``update_nodes`` and ``update_users`` methods, which take
+            a list of nodes or users. Defaults to ``WebsiteSearchBackend``.
+        """
+        self.coalesce = coalesce
+        self.backend = backend or WebsiteSearchBackend()
+        self.reset_stats()
+
+    def reset_stats(self):
+        # Updates requested, dropped because the same object was already queued, and sent
+        self.requested = 0
+        self.coalesced = 0
+        self.emitted = 0
+
+    def stats(self):
+        return {'requested': self.requested, 'coalesced': self.coalesced, 'emitted': self.emitted}
+
+    def update_node(self, node):
+        """Reindex ``node`` now, or once when the transaction commits."""
+        if not self.coalesce or not connection.in_atomic_block:
+            self.flush(self._single(node=node))
+        else:
+            self._get_buffer().add_node(node)
+
+    def update_user(self, user):
+        """Reindex ``user`` now, or once when the transaction commits."""
+        if not self.coalesce or not connection.in_atomic_block:
+            self.flush(self._single(user=user))
+        else:
+            self._get_buffer().add_user(user)
+
+    def _single(self, node=None, user=None):
+        buffer = SearchUpdateBuffer()
+        if node is not None:
+            buffer.add_node(node)
+        if user is not None:
+            buffer.add_user(user)
+        return buffer
+
+    def _get_buffer(self):
+        buffer = getattr(_local, 'buffer', None)
+        # If the transaction that the buffer was made for was rolled back, its
+        # on_commit callback was dropped, and so are its updates
+        pending = (getattr(func, 'buffer', None) for _, func in connection.run_on_commit)
+        if buffer is None or buffer not in pending:
+            buffer = _local.buffer = SearchUpdateBuffer()
+
+            def flush_buffer():
+                if getattr(_local, 'buffer', None) is buffer:
+                    _local.buffer = None
+                self.flush(buffer)
+            flush_buffer.buffer = buffer
+            # Unlike transaction.on_commit, register the callback with the outermost
+            # atomic block rather than the current savepoint, so that rolling back the
+            # savepoint doesn't drop the updates queued after it
+            connection.run_on_commit.append((set(), flush_buffer))
+        return buffer
+
+    def flush(self, buffer):
+        """Send the updates in ``buffer``, each node and user once. The backend gets all of
+        the nodes in one call, and all of the users in another.
+        """
+        emitted = len(buffer.nodes) + len(buffer.users)
+        self.requested += buffer.requested
+        self.coalesced += buffer.requested - emitted
+        self.emitted += emitted
+        if buffer.nodes:
+            self.backend.update_nodes(list(buffer.nodes.values()))
+        if buffer.users:
+            self.backend.update_users(list(buffer.users.values()))
+        return buffer
+
+search_updater = SearchUpdater()